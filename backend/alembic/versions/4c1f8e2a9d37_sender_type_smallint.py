@@ -0,0 +1,57 @@
+"""store messages.sender_type as smallint
+
+Revision ID: 4c1f8e2a9d37
+Revises: 37659db846e7
+Create Date: 2025-04-18 10:12:43.519027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import text
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1f8e2a9d37'
+down_revision = '37659db846e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 新增 SMALLINT 列并按映射回填：USER=1, AI=2, SYSTEM=3
+    op.add_column('messages', sa.Column('sender_type_new', sa.SmallInteger(), nullable=True))
+    op.execute(
+        text("""
+        UPDATE messages SET sender_type_new = CASE sender_type::text
+            WHEN 'USER' THEN 1
+            WHEN 'AI' THEN 2
+            WHEN 'SYSTEM' THEN 3
+        END
+        """)
+    )
+    op.alter_column('messages', 'sender_type_new', nullable=False)
+
+    # 替换旧的枚举列
+    op.drop_column('messages', 'sender_type')
+    op.alter_column('messages', 'sender_type_new', new_column_name='sender_type')
+    sa.Enum(name='sendertype').drop(op.get_bind())
+
+
+def downgrade():
+    sender_type = sa.Enum('USER', 'AI', 'SYSTEM', name='sendertype')
+    sender_type.create(op.get_bind())
+
+    op.add_column('messages', sa.Column('sender_type_old', sender_type, nullable=True))
+    op.execute(
+        text("""
+        UPDATE messages SET sender_type_old = (CASE sender_type
+            WHEN 1 THEN 'USER'
+            WHEN 2 THEN 'AI'
+            WHEN 3 THEN 'SYSTEM'
+        END)::sendertype
+        """)
+    )
+    op.alter_column('messages', 'sender_type_old', nullable=False)
+
+    op.drop_column('messages', 'sender_type')
+    op.alter_column('messages', 'sender_type_old', new_column_name='sender_type')
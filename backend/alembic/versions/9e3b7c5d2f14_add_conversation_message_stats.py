@@ -0,0 +1,41 @@
+"""add conversation message_count and last_message_at
+
+Revision ID: 9e3b7c5d2f14
+Revises: 4c1f8e2a9d37
+Create Date: 2025-04-19 14:27:05.118342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import text
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3b7c5d2f14'
+down_revision = '4c1f8e2a9d37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('conversations', sa.Column('message_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('conversations', sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=True))
+
+    # 回填已有对话的消息统计
+    op.execute(
+        text("""
+        UPDATE conversations c
+        SET message_count = s.message_count, last_message_at = s.last_message_at
+        FROM (
+            SELECT conversation_id, count(*) AS message_count, max(created_at) AS last_message_at
+            FROM messages
+            GROUP BY conversation_id
+        ) s
+        WHERE s.conversation_id = c.id
+        """)
+    )
+
+
+def downgrade():
+    op.drop_column('conversations', 'last_message_at')
+    op.drop_column('conversations', 'message_count')
@@ -0,0 +1,26 @@
+"""add file_sha256 to documents for duplicate upload detection
+
+Revision ID: a8d4b6e2f195
+Revises: f3c9d2e8a417
+Create Date: 2025-04-22 10:12:54.318027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d4b6e2f195'
+down_revision = 'f3c9d2e8a417'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('documents', sa.Column('file_sha256', sa.String(length=64), nullable=True))
+    op.create_index('ix_documents_file_sha256', 'documents', ['file_sha256'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_documents_file_sha256', table_name='documents')
+    op.drop_column('documents', 'file_sha256')
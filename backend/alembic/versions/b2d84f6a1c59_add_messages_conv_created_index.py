@@ -0,0 +1,30 @@
+"""add covering index on messages (conversation_id, created_at)
+
+Revision ID: b2d84f6a1c59
+Revises: 9e3b7c5d2f14
+Create Date: 2025-04-20 09:41:17.603281
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d84f6a1c59'
+down_revision = '9e3b7c5d2f14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_messages_conv_created',
+        'messages',
+        ['conversation_id', 'created_at'],
+        unique=False,
+        postgresql_include=['sender_type', 'sender_id']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_messages_conv_created', table_name='messages')
@@ -0,0 +1,24 @@
+"""add index on documents.created_at
+
+Revision ID: c6e2f8a4b913
+Revises: a8d4b6e2f195
+Create Date: 2025-04-22 15:37:08.214590
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e2f8a4b913'
+down_revision = 'a8d4b6e2f195'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_documents_created_at', 'documents', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_documents_created_at', table_name='documents')
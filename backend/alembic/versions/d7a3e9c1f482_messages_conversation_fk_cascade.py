@@ -0,0 +1,36 @@
+"""cascade deletes from conversations to messages
+
+Revision ID: d7a3e9c1f482
+Revises: b2d84f6a1c59
+Create Date: 2025-04-20 15:08:52.274916
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a3e9c1f482'
+down_revision = 'b2d84f6a1c59'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 初始迁移创建的外键未命名，使用 PostgreSQL 默认的约束名
+    op.drop_constraint('messages_conversation_id_fkey', 'messages', type_='foreignkey')
+    op.create_foreign_key(
+        'messages_conversation_id_fkey',
+        'messages', 'conversations',
+        ['conversation_id'], ['id'],
+        ondelete='CASCADE'
+    )
+
+
+def downgrade():
+    op.drop_constraint('messages_conversation_id_fkey', 'messages', type_='foreignkey')
+    op.create_foreign_key(
+        'messages_conversation_id_fkey',
+        'messages', 'conversations',
+        ['conversation_id'], ['id']
+    )
@@ -0,0 +1,31 @@
+"""scope documents.file_sha256 uniqueness to the uploading user
+
+Revision ID: d9b3c7f1e628
+Revises: c6e2f8a4b913
+Create Date: 2025-04-23 11:06:42.571903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9b3c7f1e628'
+down_revision = 'c6e2f8a4b913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_documents_file_sha256', table_name='documents')
+    op.create_index(
+        'ix_documents_uploaded_by_file_sha256',
+        'documents',
+        ['uploaded_by', 'file_sha256'],
+        unique=True
+    )
+
+
+def downgrade():
+    op.drop_index('ix_documents_uploaded_by_file_sha256', table_name='documents')
+    op.create_index('ix_documents_file_sha256', 'documents', ['file_sha256'], unique=True)
@@ -0,0 +1,50 @@
+"""add conversation_summary materialized view
+
+Revision ID: e5f1a7b3c826
+Revises: d7a3e9c1f482
+Create Date: 2025-04-21 11:23:09.457130
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import text
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5f1a7b3c826'
+down_revision = 'd7a3e9c1f482'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 消息数量和最后消息时间直接取对话表上维护的字段，最后一条消息片段通过 ix_messages_conv_created 索引获取
+    op.execute(
+        text("""
+        CREATE MATERIALIZED VIEW conversation_summary AS
+        SELECT
+            c.id,
+            c.title,
+            c.user_id,
+            c.created_at,
+            c.updated_at,
+            c.message_count AS msg_count,
+            c.last_message_at,
+            left(lm.content, 200) AS last_snippet
+        FROM conversations c
+        LEFT JOIN LATERAL (
+            SELECT m.content
+            FROM messages m
+            WHERE m.conversation_id = c.id
+            ORDER BY m.created_at DESC
+            LIMIT 1
+        ) lm ON true
+        """)
+    )
+    # REFRESH ... CONCURRENTLY 需要唯一索引
+    op.execute(text("CREATE UNIQUE INDEX ix_conversation_summary_id ON conversation_summary (id)"))
+    op.execute(text("CREATE INDEX ix_conversation_summary_user_updated ON conversation_summary (user_id, updated_at DESC)"))
+
+
+def downgrade():
+    op.execute(text("DROP MATERIALIZED VIEW IF EXISTS conversation_summary"))
@@ -0,0 +1,24 @@
+"""add claimed_at lease to documents for the processing worker
+
+Revision ID: e8a2c4f6b193
+Revises: d9b3c7f1e628
+Create Date: 2025-04-24 09:31:17.204658
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a2c4f6b193'
+down_revision = 'd9b3c7f1e628'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('documents', sa.Column('claimed_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    op.drop_column('documents', 'claimed_at')
@@ -0,0 +1,26 @@
+"""server-side defaults for conversation and message timestamps
+
+Revision ID: f3c9d2e8a417
+Revises: e5f1a7b3c826
+Create Date: 2025-04-21 16:45:38.902614
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c9d2e8a417'
+down_revision = 'e5f1a7b3c826'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('conversations', 'updated_at', server_default=sa.text('now()'))
+    op.alter_column('messages', 'created_at', server_default=sa.text('clock_timestamp()'))
+
+
+def downgrade():
+    op.alter_column('messages', 'created_at', server_default=sa.text('now()'))
+    op.alter_column('conversations', 'updated_at', server_default=None)
@@ -2,6 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.api.routes import router
+from app.api.responses import AppJSONResponse
 from app.core.config import settings
 
 def create_app() -> FastAPI:
@@ -9,7 +10,9 @@ def create_app() -> FastAPI:
         title=settings.PROJECT_NAME,
         description=settings.PROJECT_DESCRIPTION,
         version=settings.PROJECT_VERSION,
-        openapi_url=f"{settings.API_V1_STR}/openapi.json"
+        openapi_url=f"{settings.API_V1_STR}/openapi.json",
+        # 默认使用 orjson 序列化响应
+        default_response_class=AppJSONResponse
     )
 
     # Set up CORS middleware
@@ -0,0 +1,36 @@
+from typing import Any
+from decimal import Decimal
+import enum
+import msgspec
+import orjson
+from fastapi.responses import Response, ORJSONResponse
+from pydantic import BaseModel
+
+_encoder = msgspec.json.Encoder()
+
+class MsgspecJSONResponse(Response):
+    """使用 msgspec 序列化的 JSON 响应，适用于 msgspec.Struct 内容"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return _encoder.encode(content)
+
+def _orjson_default(obj: Any) -> Any:
+    """orjson 不能直接序列化的类型"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+class AppJSONResponse(ORJSONResponse):
+    """应用默认的 JSON 响应，使用 orjson 序列化，直接返回的 Pydantic 模型只做一次 model_dump"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_orjson_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
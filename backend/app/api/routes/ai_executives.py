@@ -4,11 +4,13 @@ from typing import List
 
 from app.db.session import get_db
 from app.api.deps import get_current_user, get_current_active_superuser
-from app.schemas.ai_executive import AIExecutive, AIExecutiveCreate, AIExecutiveUpdate
+from app.schemas.ai_executive import AIExecutive, AIExecutiveCreate, AIExecutiveUpdate, AIExecutiveSummary
 from app.schemas.user import User
+from app.schemas.utils import build_from_orm
 from app.services.ai_executive import (
     get_ai_executives, get_ai_executive, create_ai_executive,
-    update_ai_executive, delete_ai_executive, get_ai_executive_by_role
+    update_ai_executive, delete_ai_executive, get_ai_executive_by_role,
+    get_ai_executive_summaries
 )
 
 router = APIRouter()
@@ -24,7 +26,22 @@ async def read_executives(
     """
     获取所有AI高管列表
     """
-    return get_ai_executives(db, skip=skip, limit=limit, active_only=active_only)
+    executives = get_ai_executives(db, skip=skip, limit=limit, active_only=active_only)
+    return [build_from_orm(AIExecutive, executive) for executive in executives]
+
+@router.get("/summary", response_model=List[AIExecutiveSummary])
+async def read_executive_summaries(
+    db: Session = Depends(get_db),
+    skip: int = 0,
+    limit: int = 100,
+    active_only: bool = False,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    获取AI高管简要列表（不包含提示词模板）
+    """
+    executives = get_ai_executive_summaries(db, skip=skip, limit=limit, active_only=active_only)
+    return [build_from_orm(AIExecutiveSummary, executive) for executive in executives]
 
 @router.get("/{executive_id}", response_model=AIExecutive)
 async def read_executive(
@@ -6,7 +6,7 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
 from app.core.security import create_access_token
-from app.services.user import authenticate_user, create_user, check_user_exists
+from app.services.user import authenticate_user, create_user
 from app.db.session import get_db
 from app.core.config import settings
 from app.schemas.user import UserCreate, User
@@ -52,13 +52,6 @@ def register_user(
     """
     注册新用户
     """
-    # 检查用户是否已存在
-    if check_user_exists(db, user_in.email):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered",
-        )
-
     try:
         # 创建新用户，初始情况下非超级用户
         user_data = user_in.dict()
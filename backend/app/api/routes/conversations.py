@@ -1,5 +1,7 @@
-from typing import List, Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from typing import List, Any, Dict, Iterator
+import orjson
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.api import deps
@@ -7,27 +9,61 @@ from app.services.conversation import (
     create_conversation,
     get_conversation,
     get_conversations,
+    get_conversation_summaries,
     update_conversation,
     delete_conversation,
-    get_messages,
+    get_messages_with_senders,
+    iter_messages,
     process_user_message
 )
 from app.schemas.conversation import (
     Conversation,
     ConversationCreate,
     ConversationUpdate,
+    ConversationSummary,
     ConversationWithMessages,
-    Message,
     MessageRequest,
     MessageProcessResponse,
-    MessageResponse,
     TaskCreate
 )
+from app.schemas.structs import (
+    ConversationStruct,
+    ConversationSummaryStruct,
+    ConversationWithMessagesStruct,
+    MessageResponseStruct
+)
+from app.api.responses import MsgspecJSONResponse
+from app.db.base import SessionLocal
 from app.models.user import User
-from app.services.ai_executive import get_ai_executive
+from app.models.conversation import Message as MessageModel
 
 router = APIRouter()
 
+def _message_payload(message: MessageModel) -> Dict[str, Any]:
+    """将消息 ORM 对象转换为响应字典"""
+    return {
+        "id": message.id,
+        "conversation_id": message.conversation_id,
+        "content": message.content,
+        "sender_type": message.sender_type,
+        "sender_id": message.sender_id,
+        "created_at": message.created_at,
+    }
+
+def _process_response(result: Dict[str, Any]) -> ORJSONResponse:
+    """
+    构建消息处理响应
+    
+    直接从 ORM 字段构建字典并用 orjson 序列化，跳过 response_model 的二次校验
+    """
+    return ORJSONResponse({
+        "user_message": _message_payload(result["user_message"]),
+        "ai_message": _message_payload(result["ai_message"]),
+        "primary_role": result["primary_role"],
+        "secondary_roles": result.get("secondary_roles", []),
+        "reasoning": result.get("reasoning", ""),
+    })
+
 @router.post("/", response_model=Conversation)
 async def create_new_conversation(
     *,
@@ -45,7 +81,11 @@ async def create_new_conversation(
     )
     return conversation
 
-@router.get("/", response_model=List[Conversation])
+@router.get(
+    "/",
+    response_class=MsgspecJSONResponse,
+    responses={200: {"model": List[Conversation]}}
+)
 def read_conversations(
     db: Session = Depends(deps.get_db),
     skip: int = 0,
@@ -58,9 +98,53 @@ def read_conversations(
     conversations = get_conversations(
         db=db, user_id=current_user.id, skip=skip, limit=limit
     )
-    return conversations
+    return MsgspecJSONResponse([
+        ConversationStruct(
+            id=conversation.id,
+            title=conversation.title,
+            user_id=conversation.user_id,
+            created_at=conversation.created_at,
+            updated_at=conversation.updated_at
+        )
+        for conversation in conversations
+    ])
+
+@router.get(
+    "/summaries",
+    response_class=MsgspecJSONResponse,
+    responses={200: {"model": List[ConversationSummary]}}
+)
+def read_conversation_summaries(
+    db: Session = Depends(deps.get_db),
+    skip: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    获取当前用户的对话摘要列表（包含消息数量和最后一条消息片段）
+    """
+    summaries = get_conversation_summaries(
+        db=db, user_id=current_user.id, skip=skip, limit=limit
+    )
+    return MsgspecJSONResponse([
+        ConversationSummaryStruct(
+            id=summary.id,
+            title=summary.title,
+            user_id=summary.user_id,
+            created_at=summary.created_at,
+            updated_at=summary.updated_at,
+            msg_count=summary.msg_count,
+            last_message_at=summary.last_message_at,
+            last_snippet=summary.last_snippet
+        )
+        for summary in summaries
+    ])
 
-@router.get("/{conversation_id}", response_model=ConversationWithMessages)
+@router.get(
+    "/{conversation_id}",
+    response_class=MsgspecJSONResponse,
+    responses={200: {"model": ConversationWithMessages}}
+)
 def read_conversation(
     *,
     db: Session = Depends(deps.get_db),
@@ -77,39 +161,25 @@ def read_conversation(
     if conversation.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="没有权限访问此对话")
     
-    # 获取对话相关的所有消息
-    messages = get_messages(db=db, conversation_id=conversation_id)
+    # 获取对话相关的所有消息，发送者信息在同一个查询中连接得到
+    rows = get_messages_with_senders(db=db, conversation_id=conversation_id)
     
     # 构建包含发送者信息的消息响应
-    message_responses = []
-    for msg in messages:
-        sender_name = None
-        sender_role = None
-        
-        if msg.sender_type == "AI":
-            # 如果是AI消息，获取对应的AI高管信息
-            ai_executive = get_ai_executive(db=db, executive_id=msg.sender_id)
-            if ai_executive:
-                sender_name = ai_executive.name
-                sender_role = ai_executive.role
-        elif msg.sender_type == "USER":
-            # 如果是用户消息，使用用户名
-            sender_name = current_user.full_name or current_user.email
-        
-        message_responses.append(
-            MessageResponse(
-                id=msg.id,
-                content=msg.content,
-                sender_type=msg.sender_type,
-                sender_id=msg.sender_id,
-                sender_name=sender_name,
-                sender_role=sender_role,
-                created_at=msg.created_at
-            )
+    message_responses = [
+        MessageResponseStruct(
+            id=msg.id,
+            content=msg.content,
+            sender_type=msg.sender_type,
+            sender_id=msg.sender_id,
+            created_at=msg.created_at,
+            sender_name=sender_name,
+            sender_role=sender_role
         )
+        for msg, sender_name, sender_role in rows
+    ]
     
     # 创建包含消息的对话响应
-    conversation_with_messages = ConversationWithMessages(
+    conversation_with_messages = ConversationWithMessagesStruct(
         id=conversation.id,
         title=conversation.title,
         user_id=conversation.user_id,
@@ -118,7 +188,43 @@ def read_conversation(
         messages=message_responses
     )
     
-    return conversation_with_messages
+    return MsgspecJSONResponse(conversation_with_messages)
+
+def _stream_messages_ndjson(conversation_id: int) -> Iterator[bytes]:
+    """
+    逐行输出对话消息的 NDJSON
+    
+    使用独立的数据库会话：请求依赖中的会话可能在响应开始发送前就被关闭。
+    这是同步生成器，StreamingResponse 会在线程池中迭代，不会阻塞事件循环
+    """
+    db = SessionLocal()
+    try:
+        for message in iter_messages(db=db, conversation_id=conversation_id):
+            yield orjson.dumps(_message_payload(message)) + b"\n"
+    finally:
+        db.close()
+
+@router.get("/{conversation_id}/messages/stream")
+def stream_conversation_messages(
+    *,
+    db: Session = Depends(deps.get_db),
+    conversation_id: int,
+    current_user: User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    以 NDJSON 格式流式返回对话的所有消息，每行一条消息
+    """
+    conversation = get_conversation(db=db, conversation_id=conversation_id)
+    if not conversation:
+        raise HTTPException(status_code=404, detail="对话不存在")
+    
+    if conversation.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="没有权限访问此对话")
+    
+    return StreamingResponse(
+        _stream_messages_ndjson(conversation_id),
+        media_type="application/x-ndjson"
+    )
 
 @router.put("/{conversation_id}", response_model=Conversation)
 def update_existing_conversation(
@@ -163,7 +269,11 @@ def delete_existing_conversation(
     result = delete_conversation(db=db, conversation_id=conversation_id)
     return result
 
-@router.post("/{conversation_id}/messages", response_model=MessageProcessResponse)
+@router.post(
+    "/{conversation_id}/messages",
+    response_class=ORJSONResponse,
+    responses={200: {"model": MessageProcessResponse}}
+)
 async def send_message(
     *,
     db: Session = Depends(deps.get_db),
@@ -186,12 +296,17 @@ async def send_message(
         db=db,
         conversation_id=conversation_id,
         user_id=current_user.id,
-        content=message_in.content
+        content=message_in.content,
+        conversation=conversation
     )
     
-    return result
+    return _process_response(result)
 
-@router.post("/{conversation_id}/task", response_model=MessageProcessResponse)
+@router.post(
+    "/{conversation_id}/task",
+    response_class=ORJSONResponse,
+    responses={200: {"model": MessageProcessResponse}}
+)
 async def submit_task(
     *,
     db: Session = Depends(deps.get_db),
@@ -214,7 +329,8 @@ async def submit_task(
         db=db,
         conversation_id=conversation_id,
         user_id=current_user.id,
-        content=task_in.task_description
+        content=task_in.task_description,
+        conversation=conversation
     )
     
-    return result 
\ No newline at end of file
+    return _process_response(result) 
\ No newline at end of file
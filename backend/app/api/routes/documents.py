@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, BackgroundTasks, Path
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Path
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 
@@ -12,6 +12,9 @@ from app.schemas.document import (
     VectorSearchQuery
 )
 from app.schemas.user import User
+from app.schemas.utils import build_from_orm
+from app.schemas.structs import DocumentSearchResponseStruct
+from app.api.responses import MsgspecJSONResponse
 from app.services.document import (
     create_document, 
     get_document, 
@@ -39,12 +42,13 @@ async def read_documents(
     可选的关键字搜索功能（基于标题和描述）
     """
     if search:
-        return search_documents_by_keyword(db, search, skip, limit)
-    return get_documents(db, skip=skip, limit=limit)
+        docs = search_documents_by_keyword(db, search, skip, limit)
+    else:
+        docs = get_documents(db, skip=skip, limit=limit)
+    return [build_from_orm(DocumentResponse, doc) for doc in docs]
 
 @router.post("/", response_model=DocumentCreateResponse)
 async def upload_document(
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     file: UploadFile = File(...),
     title: str = Form(...),
@@ -57,13 +61,12 @@ async def upload_document(
     文件处理和向量化将在后台异步进行
     """
     try:
-        doc = await create_document(
+        doc, duplicate = await create_document(
             db=db,
             file=file,
             title=title,
             description=description,
-            user_id=current_user.id,
-            background_tasks=background_tasks
+            user_id=current_user.id
         )
         
         return DocumentCreateResponse(
@@ -73,7 +76,12 @@ async def upload_document(
             content_type=doc.content_type,
             created_at=doc.created_at,
             processing_status=doc.processing_status,
-            message="文档上传成功，正在后台处理中"
+            message=(
+                "相同内容的文档已存在，已返回现有文档，本次提交的标题和描述未保存"
+                if duplicate
+                else "文档上传成功，正在后台处理中"
+            ),
+            duplicate=duplicate
         )
     except HTTPException as e:
         raise e
@@ -123,7 +131,6 @@ async def read_document_content(
 
 @router.post("/{document_id}/retry", response_model=Dict[str, str])
 async def retry_processing(
-    background_tasks: BackgroundTasks,
     document_id: int = Path(..., gt=0),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
@@ -147,7 +154,7 @@ async def retry_processing(
             detail="没有权限重新处理此文档"
         )
     
-    success = retry_document_processing(db, document_id, background_tasks)
+    success = retry_document_processing(db, document_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -188,7 +195,11 @@ async def remove_document(
     
     return {"detail": "文档删除成功"}
 
-@router.post("/search", response_model=List[DocumentSearchResponse])
+@router.post(
+    "/search",
+    response_class=MsgspecJSONResponse,
+    responses={200: {"model": List[DocumentSearchResponse]}}
+)
 async def search_documents(
     query: DocumentSearchQuery,
     db: Session = Depends(get_db),
@@ -200,9 +211,20 @@ async def search_documents(
     仅搜索标题和描述
     """
     if not query.query.strip():
-        return []
+        return MsgspecJSONResponse([])
     
-    return search_documents_by_keyword(db, query.query, 0, query.top_k)
+    docs = search_documents_by_keyword(db, query.query, 0, query.top_k)
+    return MsgspecJSONResponse([
+        DocumentSearchResponseStruct(
+            id=doc.id,
+            title=doc.title,
+            content_type=doc.content_type,
+            created_at=doc.created_at,
+            processing_status=doc.processing_status,
+            description=doc.description
+        )
+        for doc in docs
+    ])
 
 @router.post("/vector-search", response_model=List[Dict[str, Any]])
 async def vector_search(
@@ -27,6 +27,15 @@ class Settings(BaseSettings):
     
     SQLALCHEMY_DATABASE_URI: Optional[PostgresDsn] = None
     
+    # Database connection pool
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "60"))  # 秒
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # 秒
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+    # 通过 PgBouncer（transaction 模式）连接时设为 true，由 PgBouncer 负责连接池
+    DB_USE_PGBOUNCER: bool = os.getenv("DB_USE_PGBOUNCER", "false").lower() == "true"
+    
     @field_validator("SQLALCHEMY_DATABASE_URI", mode="before")
     def assemble_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
         if isinstance(v, str):
@@ -45,10 +54,20 @@ class Settings(BaseSettings):
     PINECONE_API_KEY: str = os.getenv("PINECONE_API_KEY", "")
     PINECONE_INDEX_NAME: str = "ai-executive-team"
     PINECONE_ENVIRONMENT: Optional[str] = None
+    # 每次 upsert 的向量数量和并行 upsert 使用的线程数
+    PINECONE_UPSERT_BATCH_SIZE: int = int(os.getenv("PINECONE_UPSERT_BATCH_SIZE", "100"))
+    PINECONE_POOL_THREADS: int = int(os.getenv("PINECONE_POOL_THREADS", "30"))
     
     # OpenAI API
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    # 嵌入请求每批的文本块数量和同时进行的请求数
+    # （中文文本块约 1000 token，128 块一批可以留在单次请求的 token 上限以内）
+    EMBED_BATCH_SIZE: int = int(os.getenv("EMBED_BATCH_SIZE", "128"))
+    EMBED_CONCURRENCY: int = int(os.getenv("EMBED_CONCURRENCY", "4"))
+    # 嵌入向量维度（text-embedding-3 系列支持降维，例如 512 可以把上传和查询的数据量减少约 2/3，召回率略有下降）；
+    # 修改后需要重建 Pinecone 索引（fix_pinecone.py 或 reset_vector_store）并重新处理文档
+    EMBED_DIMENSIONS: int = int(os.getenv("EMBED_DIMENSIONS", "1536"))
     
     # Email settings
     EMAIL_SENDER: str = os.getenv("EMAIL_SENDER", "youming@vchaoxi.com")
@@ -56,6 +75,8 @@ class Settings(BaseSettings):
     
     # 文件上传目录
     UPLOAD_DIR: str = "uploads"
+    # 并行提取大型 PDF 的进程数上限（每个进程都会占用一份 PyMuPDF/pypdf 的内存）
+    PDF_EXTRACT_MAX_WORKERS: int = int(os.getenv("PDF_EXTRACT_MAX_WORKERS", "4"))
     
     # 管理员账户
     FIRST_SUPERUSER_EMAIL: str = os.getenv("FIRST_SUPERUSER_EMAIL", "admin@example.com")
@@ -1,8 +1,29 @@
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool, QueuePool
 from app.core.config import settings
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+# 连接池配置：
+# - 直连 PostgreSQL 时使用 QueuePool，pool_size/max_overflow 限制每个 worker 的连接数，
+#   pool_timeout 控制等待空闲连接的最长时间，pool_use_lifo 让空闲连接集中在少数连接上
+# - 默认关闭 pool_pre_ping：每次取连接都会多一次往返，并且在 PgBouncer transaction 模式下
+#   会造成 "idle in transaction" 连接堆积；改为用较短的 pool_recycle 淘汰空闲连接，
+#   连接失效时 SQLAlchemy 会在 DBAPI 报错后自动作废整个连接池（invalidate），下一次请求重新建立连接。
+#   需要在取连接时检测存活的部署可以设置 DB_POOL_PRE_PING=true
+# - 通过 PgBouncer（transaction 模式）连接时使用 NullPool，避免在应用和 PgBouncer 两层重复池化
+if settings.DB_USE_PGBOUNCER:
+    engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI), poolclass=NullPool)
+else:
+    engine = create_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI),
+        poolclass=QueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_use_lifo=True
+    )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base() 
\ No newline at end of file
+Base = declarative_base()
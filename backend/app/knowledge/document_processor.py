@@ -1,11 +1,47 @@
 import os
-import re
+import csv
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import count
+from typing import List, Optional, Tuple, Iterator, Iterable, Union
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from app.core.config import settings
 from app.knowledge.vector_store import add_documents, check_api_key
 
+# 可选的文档解析依赖：模块加载时导入一次，未安装时为 None，处理对应格式时再报错
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+try:
+    import docx
+except ImportError:
+    docx = None
+
+try:
+    import textract
+except ImportError:
+    textract = None
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+try:
+    from bs4 import BeautifulSoup, FeatureNotFound
+except ImportError:
+    BeautifulSoup = FeatureNotFound = None
+
 # 设置日志记录器
 logger = logging.getLogger(__name__)
 
@@ -23,9 +59,41 @@ SUPPORTED_EXTENSIONS = {
     '.csv': 'text/csv'
 }
 
-def split_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
+# 页数达到该值的 PDF 才使用多进程提取，较小的文件不值得进程间传输的开销
+PDF_PARALLEL_MIN_PAGES = 8
+
+# 全局变量：PDF 提取进程池（首次使用时创建，之后复用）
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+_pdf_executor_lock = threading.Lock()
+
+# 文本分割使用的句子结束标记
+SENTENCE_SEPARATORS = ('. ', '! ', '? ', '。', '！', '？', '\n')
+
+def _find_chunk_end(text: str, start: int, chunk_size: int) -> int:
+    """确定从 start 开始的文本块的结束位置，尽量在段落或句子边界截断"""
+    text_length = len(text)
+    end = min(start + chunk_size, text_length)
+    
+    # 尝试在句子或段落边界截断（rfind 在 C 层面查找，不逐字符扫描）
+    if end < text_length:
+        min_end = start + chunk_size // 2
+        # 寻找段落结束
+        paragraph_end = text.rfind('\n\n', min_end, end)
+        if paragraph_end != -1:
+            end = paragraph_end + 2  # 包含换行符
+        else:
+            # 寻找句子结束
+            sentence_end = max(text.rfind(sep, min_end, end) for sep in SENTENCE_SEPARATORS)
+            if sentence_end != -1:
+                end = sentence_end + 1  # 包含标点
+    
+    return end
+
+def iter_chunks(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> Iterator[str]:
     """
-    将文本分割成更小的块进行处理
+    逐个生成文本块，尽量在段落或句子边界截断
+    
+    生成器按需切分，调用方可以边切分边处理，不需要先得到全部文本块
     
     Args:
         text: 要分割的文本
@@ -33,139 +101,370 @@ def split_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> L
         chunk_overlap: 块之间的重叠部分
         
     Returns:
-        文本块列表
+        文本块迭代器
     """
-    if not text or not text.strip():
-        logger.warning("收到空文本进行分割")
-        return []
+    text_length = len(text)
     
-    # 使用 LangChain 的文本分割器
-    try:
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+    # 常见的短文本只有一个块，不需要查找边界
+    if text_length <= chunk_size:
+        if text:
+            yield text
+        return
+    
+    start = 0
+    
+    while start < text_length:
+        end = _find_chunk_end(text, start, chunk_size)
         
-        chunks = text_splitter.split_text(text)
-        logger.info(f"文本已分割为 {len(chunks)} 个块")
-        return chunks
-    except Exception as e:
-        logger.error(f"文本分割失败: {str(e)}")
-        # 在分割失败的情况下，尝试简单分割
-        return fallback_text_split(text, chunk_size, chunk_overlap)
+        yield text[start:end]
+        if end >= text_length:
+            break
+        # 保证重叠；块长度不超过重叠长度时直接从块尾继续，避免原地循环
+        start = end - chunk_overlap if end - chunk_overlap > start else end
 
-def fallback_text_split(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
+def iter_chunks_from_segments(
+    segments: Iterable[str],
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200
+) -> Iterator[str]:
     """
-    简单的文本分割方法，作为备用
+    对分段到达的文本（例如逐页提取的 PDF）逐个生成文本块
+    
+    缓冲区中超过一个块长度的部分，切分结果不受后续文本影响，可以立即生成；
+    结果与对拼接后的全文调用 iter_chunks 相同
     
     Args:
-        text: 要分割的文本
+        segments: 按顺序到达的文本片段
         chunk_size: 每个块的目标大小
         chunk_overlap: 块之间的重叠部分
         
     Returns:
-        文本块列表
+        文本块迭代器
     """
-    chunks = []
+    buffer = ""
     start = 0
-    text_length = len(text)
     
-    while start < text_length:
-        end = min(start + chunk_size, text_length)
+    for segment in segments:
+        buffer = buffer[start:] + segment
+        start = 0
         
-        # 尝试在句子或段落边界截断
-        if end < text_length:
-            # 寻找段落结束
-            paragraph_end = text.rfind('\n\n', start, end)
-            if paragraph_end > start + chunk_size // 2:
-                end = paragraph_end + 2  # 包含换行符
-            else:
-                # 寻找句子结束
-                sentence_end = max(
-                    text.rfind('. ', start, end),
-                    text.rfind('! ', start, end),
-                    text.rfind('? ', start, end)
-                )
-                if sentence_end > start + chunk_size // 2:
-                    end = sentence_end + 2  # 包含标点和空格
-        
-        chunks.append(text[start:end])
-        start = max(start, end - chunk_overlap)  # 保证重叠
+        while len(buffer) - start > chunk_size:
+            end = _find_chunk_end(buffer, start, chunk_size)
+            yield buffer[start:end]
+            start = end - chunk_overlap if end - chunk_overlap > start else end
     
-    logger.info(f"使用备用方法将文本分割为 {len(chunks)} 个块")
-    return chunks
+    yield from iter_chunks(buffer[start:], chunk_size, chunk_overlap)
 
 def process_document(
     document_id: int,
     document_title: str,
-    text_content: str,
+    text_content: Union[str, Iterable[str]],
     namespace: str = "default"
-) -> Tuple[List[str], List[str], str]:
+) -> Tuple[List[str], int, str]:
     """
     通过分割和添加到向量存储来处理文档
     
+    文本块和元数据以生成器的形式交给向量存储，边切分边嵌入上传，不同时保存全部文本块；
+    text_content 也可以是按顺序到达的文本片段（例如 iter_text_from_file 的结果），
+    这样提取、切分和向量化可以同时进行
+    
     Args:
         document_id: 文档ID
         document_title: 文档标题
-        text_content: 文档文本内容
+        text_content: 文档文本内容，或文本片段迭代器
         namespace: 向量存储中使用的命名空间
         
     Returns:
-        Tuple 包含：(成功的向量ID列表, 失败的文本块列表, 处理状态)
+        Tuple 包含：(成功的向量ID列表, 失败的文本块数量, 处理状态)
     """
     process_status = "completed"  # 默认状态
     
     # 检查 Pinecone API 密钥
     if not check_api_key():
         logger.warning(f"处理文档 {document_id} 失败：未配置向量存储API密钥")
-        return ([], [], "api_key_missing")
+        return ([], 0, "api_key_missing")
+    
+    if isinstance(text_content, str):
+        if not text_content.strip():
+            logger.warning(f"文档 {document_id} 未生成任何文本块")
+            return ([], 0, "no_chunks")
+        text_content = (text_content,)
     
-    # 分割文本为块
-    chunks = split_text(text_content)
+    # 已生成的文本块数量（跳过只有空白的块）
+    chunk_count = 0
     
-    if not chunks:
-        logger.warning(f"文档 {document_id} 未生成任何文本块")
-        return ([], [], "no_chunks")
+    def counted_chunks() -> Iterator[str]:
+        nonlocal chunk_count
+        for chunk in iter_chunks_from_segments(text_content):
+            if chunk.strip():
+                chunk_count += 1
+                yield chunk
     
-    # 为每个块准备元数据
-    metadatas = [
+    chunks = counted_chunks()
+    
+    # 每个块的元数据，与文本块按顺序对应
+    metadatas = (
         {
             "document_title": document_title,
             "chunk_index": i,
         }
-        for i in range(len(chunks))
-    ]
+        for i in count()
+    )
     
     # 添加块到向量存储
     try:
-        logger.info(f"将文档 {document_id} 的 {len(chunks)} 个块添加到向量存储")
-        vector_ids, failed_texts = add_documents(
+        logger.info(f"将文档 {document_id} 的文本块添加到向量存储")
+        vector_ids, failed_count = add_documents(
             texts=chunks,
             metadatas=metadatas,
             document_id=document_id,
             namespace=namespace
         )
         
+        if not chunk_count:
+            logger.warning(f"文档 {document_id} 未生成任何文本块")
+            return ([], 0, "no_chunks")
+        
         # 如果有部分失败，更新状态
-        if failed_texts:
+        if failed_count:
             process_status = "partial"
-            logger.warning(f"文档 {document_id} 的 {len(failed_texts)} 个块添加失败")
+            logger.warning(f"文档 {document_id} 的 {failed_count} 个块添加失败")
         
-        return (vector_ids, failed_texts, process_status)
+        return (vector_ids, failed_count, process_status)
     
     except Exception as e:
         logger.error(f"向量化文档 {document_id} 失败: {str(e)}")
-        return ([], chunks, "failed")
+        # 只统计已经生成的文本块，不为计数再读取剩余文本（可能需要重新提取整个文件）
+        return ([], chunk_count, "failed")
+
+def _pdf_extract_workers() -> int:
+    """PDF 提取进程数：CPU 核数，不超过 settings.PDF_EXTRACT_MAX_WORKERS"""
+    return max(1, min(os.cpu_count() or 1, settings.PDF_EXTRACT_MAX_WORKERS))
+
+def _get_pdf_executor() -> ProcessPoolExecutor:
+    """
+    获取共享的 PDF 提取进程池
+    
+    进程池在工作线程中按需创建，此时进程内已有 Pinecone 线程池、嵌入生产者线程等线程；
+    使用 forkserver（Windows 上为 spawn）启动子进程，避免 fork 继承其他线程持有的锁（日志、HTTP 客户端等）导致子进程死锁
+    """
+    global _pdf_executor
+    
+    if _pdf_executor is None:
+        with _pdf_executor_lock:
+            if _pdf_executor is None:
+                _pdf_executor = ProcessPoolExecutor(
+                    max_workers=_pdf_extract_workers(),
+                    mp_context=multiprocessing.get_context(
+                        "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                    )
+                )
+    return _pdf_executor
+
+def _get_pdf_page_count(file_path: str) -> int:
+    """获取 PDF 页数，优先使用 PyMuPDF，未安装时使用 pypdf"""
+    if fitz is not None:
+        with fitz.open(file_path) as doc:
+            return doc.page_count
+    
+    if PdfReader is None:
+        raise ImportError("未安装 PyMuPDF 或 pypdf")
+    return len(PdfReader(file_path).pages)
+
+def _iter_pdf_pages(file_path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    """
+    逐页提取 PDF 中 [start, stop) 范围内的文本，文件只打开一次，读到哪一页才提取哪一页
+    
+    优先使用 PyMuPDF（C 实现，比 pypdf 快数倍），未安装时使用 pypdf
+    """
+    if fitz is not None:
+        with fitz.open(file_path) as doc:
+            for i in range(start, doc.page_count if stop is None else stop):
+                # 添加页码信息
+                yield f"--- 页 {i+1} ---\n{doc[i].get_text('text')}\n\n"
+        return
+    
+    if PdfReader is None:
+        raise ImportError("未安装 PyMuPDF 或 pypdf")
+    reader = PdfReader(file_path)
+    for i in range(start, len(reader.pages) if stop is None else stop):
+        # 添加页码信息
+        yield f"--- 页 {i+1} ---\n{reader.pages[i].extract_text() or ''}\n\n"
 
-def extract_text_from_file(file_path: str, content_type: Optional[str] = None) -> str:
+def _extract_pdf_pages(file_path: str, start: int, stop: int) -> List[str]:
+    """
+    提取 PDF 中 [start, stop) 范围内各页的文本（在子进程中执行）
+    
+    文档对象不能在进程间传递，每个子进程自行打开文件
+    """
+    return list(_iter_pdf_pages(file_path, start, stop))
+
+def iter_pdf_text(file_path: str) -> Iterator[str]:
+    """
+    按页码顺序逐页生成 PDF 文本
+    
+    页数不少于 PDF_PARALLEL_MIN_PAGES 时按页码区间分给进程池并行提取，
+    前面的区间提取完成后立即生成，不等待整个文件提取完成
+    
+    Args:
+        file_path: PDF 文件路径
+        
+    Returns:
+        带页码标记的各页文本迭代器
+    """
+    global _pdf_executor
+    
+    n_pages = _get_pdf_page_count(file_path)
+    
+    if n_pages < PDF_PARALLEL_MIN_PAGES:
+        yield from _extract_pdf_pages(file_path, 0, n_pages)
+        return
+    
+    workers = _pdf_extract_workers()
+    step = max(1, -(-n_pages // workers))
+    ranges = [(start, min(start + step, n_pages)) for start in range(0, n_pages, step)]
+    
+    futures = []
+    try:
+        executor = _get_pdf_executor()
+        futures = [
+            executor.submit(_extract_pdf_pages, file_path, start, stop)
+            for start, stop in ranges
+        ]
+    except BrokenProcessPool as e:
+        logger.warning(f"PDF 提取进程池不可用，改为单进程提取: {str(e)}")
+        with _pdf_executor_lock:
+            _pdf_executor = None
+    
+    try:
+        for i, (start, stop) in enumerate(ranges):
+            if i < len(futures):
+                try:
+                    pages = futures[i].result()
+                except BrokenProcessPool as e:
+                    # 进程池不可用时（例如子进程被杀死）剩余页面退回单进程提取，并在下次使用时重建进程池
+                    logger.warning(f"PDF 提取进程池不可用，改为单进程提取: {str(e)}")
+                    with _pdf_executor_lock:
+                        _pdf_executor = None
+                    futures = []
+                    pages = _extract_pdf_pages(file_path, start, stop)
+            else:
+                pages = _extract_pdf_pages(file_path, start, stop)
+            yield from pages
+    finally:
+        # 调用方提前停止读取时取消尚未开始的提取
+        for future in futures:
+            future.cancel()
+
+def extract_text_from_pdf(file_path: str, max_chars: Optional[int] = None) -> str:
+    """
+    提取 PDF 文件的文本
+    
+    指定 max_chars 时在当前进程中逐页提取，累计达到 max_chars 个字符后停止，不再提取剩余页面
+    
+    Args:
+        file_path: PDF 文件路径
+        max_chars: 可选的提取字符数上限（达到后停止，结果可能略多于该值）
+        
+    Returns:
+        带页码标记的文本内容
+    """
+    if max_chars is None:
+        return "".join(iter_pdf_text(file_path))
+    
+    parts = []
+    total_chars = 0
+    for page in _iter_pdf_pages(file_path):
+        parts.append(page)
+        total_chars += len(page)
+        if total_chars >= max_chars:
+            break
+    return "".join(parts)
+
+def extract_text_from_html(file_path: str) -> str:
+    """
+    提取 HTML 文件的文本
+    
+    按 selectolax → BeautifulSoup(lxml) → BeautifulSoup(html.parser) 的顺序选择可用的解析器；
+    以字节读取文件，由解析器识别编码
+    
+    Args:
+        file_path: HTML 文件路径
+        
+    Returns:
+        清理后的文本内容
+    """
+    with open(file_path, 'rb') as f:
+        html = f.read()
+    
+    if HTMLParser is not None:
+        tree = HTMLParser(html)
+        # 移除脚本和样式标签
+        tree.strip_tags(["script", "style"])
+        root = tree.body or tree.root
+        text = root.text(separator='\n') if root is not None else ""
+    elif BeautifulSoup is not None:
+        try:
+            soup = BeautifulSoup(html, 'lxml')
+        except FeatureNotFound:
+            # 未安装 lxml
+            soup = BeautifulSoup(html, 'html.parser')
+        # 移除脚本和样式标签
+        for script in soup(["script", "style"]):
+            script.extract()
+        text = soup.get_text(separator='\n')
+    else:
+        raise ImportError("未安装 selectolax 或 beautifulsoup4")
+    
+    # 清理文本
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+def iter_text_from_file(file_path: str, content_type: Optional[str] = None) -> Iterator[str]:
+    """
+    按顺序分段生成文件文本，拼接结果与 extract_text_from_file 相同
+    
+    PDF 逐页生成，调用方可以在后续页面提取的同时处理已经提取的页面；其他格式整体作为一段
+    
+    Args:
+        file_path: 文件路径
+        content_type: 可选的内容类型（MIME类型）
+        
+    Returns:
+        文本片段迭代器
+    """
+    _, extension = os.path.splitext(file_path)
+    extension = extension.lower()
+    
+    # 与 extract_text_from_file 的判断顺序一致：纯文本优先
+    is_text = extension == '.txt' or content_type == 'text/plain'
+    is_pdf = extension == '.pdf' or content_type == 'application/pdf'
+    if is_text or not is_pdf:
+        yield extract_text_from_file(file_path, content_type)
+        return
+    
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"文件不存在: {file_path}")
+    
+    logger.info(f"从文件 {file_path} 逐页提取文本，类型: {content_type or extension}")
+    
+    try:
+        yield from iter_pdf_text(file_path)
+    except ImportError:
+        raise ImportError("请安装 PyMuPDF 或 pypdf 以处理 PDF 文件: pip install pymupdf")
+    except Exception as e:
+        logger.error(f"PDF 处理失败: {str(e)}")
+        raise ValueError(f"无法处理 PDF 文件: {str(e)}")
+
+def extract_text_from_file(file_path: str, content_type: Optional[str] = None, max_chars: Optional[int] = None) -> str:
     """
     根据文件扩展名从文件中提取文本
     
     Args:
         file_path: 文件路径
         content_type: 可选的内容类型（MIME类型）
+        max_chars: 可选的提取字符数上限，只需要开头部分时使用；目前只对 PDF 生效，其他格式提取开销较小，仍然完整提取
         
     Returns:
         提取的文本内容
@@ -195,67 +494,44 @@ def extract_text_from_file(file_path: str, content_type: Optional[str] = None) -
     
     elif extension == '.pdf' or content_type == 'application/pdf':
         try:
-            from pypdf import PdfReader
-            reader = PdfReader(file_path)
-            text = ""
-            for i, page in enumerate(reader.pages):
-                page_text = page.extract_text() or ""
-                # 添加页码信息
-                text += f"--- 页 {i+1} ---\n{page_text}\n\n"
-            return text
+            return extract_text_from_pdf(file_path, max_chars)
         except ImportError:
-            raise ImportError("请安装 pypdf 以处理 PDF 文件: pip install pypdf")
+            raise ImportError("请安装 PyMuPDF 或 pypdf 以处理 PDF 文件: pip install pymupdf")
         except Exception as e:
             logger.error(f"PDF 处理失败: {str(e)}")
             raise ValueError(f"无法处理 PDF 文件: {str(e)}")
     
     elif extension in ['.docx'] or content_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
+        if docx is None:
+            raise ImportError("请安装 python-docx 以处理 Word 文件: pip install python-docx")
         try:
-            import docx
             doc = docx.Document(file_path)
-            text = ""
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-            return text
-        except ImportError:
-            raise ImportError("请安装 python-docx 以处理 Word 文件: pip install python-docx")
+            return "".join(para.text + "\n" for para in doc.paragraphs)
         except Exception as e:
             logger.error(f"Word 文件处理失败: {str(e)}")
             raise ValueError(f"无法处理 Word 文件: {str(e)}")
     
     elif extension in ['.doc'] or content_type == 'application/msword':
+        # 使用 textract，需要额外安装 antiword
+        if textract is None:
+            raise ImportError("请安装 textract 以处理 DOC 文件: pip install textract")
         try:
-            # 尝试使用 textract，需要额外安装 antiword
-            import textract
             return textract.process(file_path).decode('utf-8')
-        except ImportError:
-            raise ImportError("请安装 textract 以处理 DOC 文件: pip install textract")
         except Exception as e:
             logger.error(f"DOC 文件处理失败: {str(e)}")
             raise ValueError(f"无法处理 DOC 文件: {str(e)}")
     
     elif extension in ['.html', '.htm'] or content_type in ['text/html']:
         try:
-            from bs4 import BeautifulSoup
-            with open(file_path, 'r', encoding='utf-8') as f:
-                soup = BeautifulSoup(f.read(), 'html.parser')
-                # 移除脚本和样式标签
-                for script in soup(["script", "style"]):
-                    script.extract()
-                text = soup.get_text(separator='\n')
-                # 清理文本
-                lines = (line.strip() for line in text.splitlines())
-                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                text = '\n'.join(chunk for chunk in chunks if chunk)
-                return text
+            return extract_text_from_html(file_path)
         except ImportError:
-            raise ImportError("请安装 beautifulsoup4 以处理 HTML 文件: pip install beautifulsoup4")
+            raise ImportError("请安装 selectolax 或 beautifulsoup4 以处理 HTML 文件: pip install selectolax")
         except Exception as e:
             logger.error(f"HTML 处理失败: {str(e)}")
             # 尝试使用简单的方法
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return f.read()
+                with open(file_path, 'rb') as f:
+                    return f.read().decode('utf-8', errors='replace')
             except:
                 raise ValueError(f"无法处理 HTML 文件: {str(e)}")
     
@@ -269,17 +545,16 @@ def extract_text_from_file(file_path: str, content_type: Optional[str] = None) -
     
     elif extension == '.csv' or content_type == 'text/csv':
         try:
-            import csv
-            text = ""
+            # 先收集各行再一次拼接，避免逐行 += 产生的重复复制
+            lines = []
             with open(file_path, 'r', encoding='utf-8') as f:
                 csv_reader = csv.reader(f)
                 headers = next(csv_reader, None)
                 if headers:
-                    text += " | ".join(headers) + "\n"
-                    text += "-" * 30 + "\n"
-                for row in csv_reader:
-                    text += " | ".join(row) + "\n"
-            return text
+                    lines.append(" | ".join(headers))
+                    lines.append("-" * 30)
+                lines.extend(" | ".join(row) for row in csv_reader)
+            return "".join(line + "\n" for line in lines)
         except Exception as e:
             logger.error(f"CSV 处理失败: {str(e)}")
             # 尝试作为纯文本读取
@@ -1,9 +1,21 @@
 from pinecone import Pinecone, ServerlessSpec, PineconeApiException, PineconeProtocolError
+from openai import OpenAI, AsyncOpenAI
+import httpx
 import os
 import time
+import asyncio
 import logging
+import threading
+import queue
+import json
+import re
+import copy
 import numpy as np
-from typing import List, Dict, Any, Optional, Tuple, Union
+from collections import deque
+from collections.abc import Sized
+from itertools import islice
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Tuple, Union, Callable, Iterable
 from app.core.config import settings
 
 # 设置日志记录器
@@ -12,10 +24,17 @@ logger = logging.getLogger(__name__)
 # 定义常量
 MAX_RETRY_ATTEMPTS = 3
 RETRY_DELAY_SECONDS = 2
-DEFAULT_DIMENSION = 1536  # OpenAI embeddings 维度
 DEFAULT_METRIC = "cosine"
 DEFAULT_CLOUD = "aws"
 DEFAULT_REGION = "us-east-1"
+OPENAI_TIMEOUT_SECONDS = 30.0
+EMBED_QUEUE_MAXSIZE = 2  # 等待上传的嵌入批次上限（每批最多 EMBED_BATCH_SIZE × EMBED_CONCURRENCY 个向量）
+EMBEDDING_MODEL = "text-embedding-3-small"
+ASYNC_HTTP_MAX_CONNECTIONS = 100
+ASYNC_HTTP_MAX_KEEPALIVE_CONNECTIONS = 50
+
+# 识别附件查询的正则（不区分大小写，避免每次查询都生成 lower() 副本）
+_ATTACHMENT_QUERY_RE = re.compile(r"附件|attachment", re.IGNORECASE)
 
 class VectorStoreStatus:
     """向量存储状态类"""
@@ -31,6 +50,52 @@ _pinecone_status = {
     "error": None
 }
 
+# 全局变量：进程内共享的 OpenAI 客户端（内部维护 HTTP 连接池，线程安全）
+_openai_client: Optional[OpenAI] = None
+_openai_client_lock = threading.Lock()
+
+# 全局变量：正在执行中的向量搜索，相同的并发查询共享同一个结果
+_inflight_searches: Dict[Tuple[str, int, str, str], Future] = {}
+_inflight_searches_lock = threading.Lock()
+
+def get_openai_client() -> OpenAI:
+    """
+    获取进程内共享的 OpenAI 客户端，首次调用时创建
+    
+    Returns:
+        OpenAI 客户端
+    """
+    global _openai_client
+    
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                _openai_client = OpenAI(
+                    api_key=settings.OPENAI_API_KEY,
+                    timeout=OPENAI_TIMEOUT_SECONDS
+                )
+    return _openai_client
+
+def create_async_openai_client() -> AsyncOpenAI:
+    """
+    创建异步 OpenAI 客户端
+    
+    底层使用支持 HTTP/2 和长连接的 httpx.AsyncClient，同一个客户端上的并发请求复用连接池；
+    异步连接池绑定创建它的事件循环，调用方负责在该事件循环中关闭（async with）
+    
+    Returns:
+        AsyncOpenAI 客户端
+    """
+    http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=ASYNC_HTTP_MAX_KEEPALIVE_CONNECTIONS
+        ),
+        timeout=OPENAI_TIMEOUT_SECONDS
+    )
+    return AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=http_client)
+
 def check_api_key() -> bool:
     """
     检查是否配置了 Pinecone API 密钥
@@ -80,7 +145,7 @@ def init_pinecone(force_recreate: bool = False) -> Optional[Any]:
             # 使用aws us-east-1配置，这是免费计划支持的
             pc.create_index(
                 name=settings.PINECONE_INDEX_NAME,
-                dimension=DEFAULT_DIMENSION,
+                dimension=settings.EMBED_DIMENSIONS,
                 metric=DEFAULT_METRIC,
                 spec=ServerlessSpec(
                     cloud=DEFAULT_CLOUD,
@@ -90,7 +155,7 @@ def init_pinecone(force_recreate: bool = False) -> Optional[Any]:
             logger.info(f"索引 {settings.PINECONE_INDEX_NAME} 创建成功")
         
         # 连接到索引
-        index = pc.Index(settings.PINECONE_INDEX_NAME)
+        index = pc.Index(settings.PINECONE_INDEX_NAME, pool_threads=settings.PINECONE_POOL_THREADS)
         
         # 更新状态
         _pinecone_status = {
@@ -159,7 +224,7 @@ def get_pinecone_index(retry: bool = True) -> Any:
                 return init_pinecone(force_recreate=True)
             
             # 获取索引
-            index = pc.Index(settings.PINECONE_INDEX_NAME)
+            index = pc.Index(settings.PINECONE_INDEX_NAME, pool_threads=settings.PINECONE_POOL_THREADS)
             
             # 验证索引是否可用
             try:
@@ -222,6 +287,14 @@ def get_pinecone_index(retry: bool = True) -> Any:
     else:
         raise RuntimeError("无法连接到 Pinecone 向量数据库")
 
+class _CompletedResult:
+    """已完成的异步请求结果，与 async_req=True 返回的对象接口一致"""
+    def __init__(self, value: Any):
+        self._value = value
+    
+    def get(self, timeout: Optional[float] = None) -> Any:
+        return self._value
+
 class MockPineconeIndex:
     """
     Pinecone 索引的模拟实现，用于在 Pinecone 不可用时提供基本功能
@@ -231,11 +304,12 @@ class MockPineconeIndex:
         logger.warning("使用模拟 Pinecone 索引，部分功能可能不可用")
     
     def describe_index_stats(self):
-        return {"dimension": DEFAULT_DIMENSION, "namespaces": {}, "total_vector_count": 0}
+        return {"dimension": settings.EMBED_DIMENSIONS, "namespaces": {}, "total_vector_count": 0}
     
-    def upsert(self, vectors, namespace=None, batch_size=None, **kwargs):
+    def upsert(self, vectors, namespace=None, batch_size=None, async_req=False, **kwargs):
         logger.warning("模拟索引: 尝试插入向量，但操作被忽略")
-        return {"upserted_count": 0}
+        result = {"upserted_count": 0}
+        return _CompletedResult(result) if async_req else result
     
     def query(self, namespace=None, top_k=10, filter=None, include_metadata=True, **kwargs):
         logger.warning("模拟索引: 尝试查询向量，返回空结果")
@@ -274,115 +348,294 @@ def get_vector_store_status() -> Dict[str, Any]:
         "configured": check_api_key()
     }
 
-def add_documents(texts: List[str], metadatas: List[Dict[str, Any]], document_id: int, namespace: str = "default") -> Tuple[List[str], List[str]]:
+async def embed_batches(
+    texts: List[str],
+    client: AsyncOpenAI,
+    batch_size: Optional[int] = None,
+    concurrency: Optional[int] = None
+) -> List[List[float]]:
+    """
+    分批并发生成文本的嵌入向量
+    
+    每批最多 batch_size 个文本调用一次 embeddings 接口，同时进行的请求不超过 concurrency 个
+    
+    Args:
+        texts: 文本列表
+        client: 异步 OpenAI 客户端
+        batch_size: 每批文本数量，默认 settings.EMBED_BATCH_SIZE
+        concurrency: 最大并发请求数，默认 settings.EMBED_CONCURRENCY
+        
+    Returns:
+        与 texts 顺序一致的嵌入向量列表
+    """
+    batch_size = max(1, batch_size or settings.EMBED_BATCH_SIZE)
+    semaphore = asyncio.Semaphore(max(1, concurrency or settings.EMBED_CONCURRENCY))
+    
+    async def embed(batch: List[str]) -> List[List[float]]:
+        async with semaphore:
+            response = await client.embeddings.create(
+                input=batch,
+                model=EMBEDDING_MODEL,
+                dimensions=settings.EMBED_DIMENSIONS
+            )
+        return [item.embedding for item in response.data]
+    
+    results = await asyncio.gather(*(
+        embed(texts[start:start + batch_size])
+        for start in range(0, len(texts), batch_size)
+    ))
+    return [embedding for batch in results for embedding in batch]
+
+def add_documents(
+    texts: Iterable[str],
+    metadatas: Iterable[Dict[str, Any]],
+    document_id: int,
+    namespace: str = "default",
+    on_failure: Optional[Callable[[int, List[str]], None]] = None
+) -> Tuple[List[str], int]:
     """
     将文档块添加到向量存储，包含元数据
     
+    texts 和 metadatas 可以是生成器，按批次逐步读取，不需要先把所有文本块放进内存；
+    嵌入生成在后台线程中进行（每组 EMBED_BATCH_SIZE × EMBED_CONCURRENCY 个文本块由 embed_batches 并发请求），
+    通过有界队列交给当前线程上传到 Pinecone，
+    上传按 PINECONE_UPSERT_BATCH_SIZE 分批、以 async_req 方式并行提交，
+    上传变慢时会自动限制嵌入生成的速度；失败的批次交给 on_failure 处理而不在内存中累积；
+    读取 texts 或 metadatas 时抛出的异常会在已读取的文本块处理完后重新抛出
+    
     Args:
-        texts: 文本块列表
-        metadatas: 每个块的元数据列表
+        texts: 文本块列表或迭代器
+        metadatas: 每个块的元数据列表或迭代器，与 texts 一一对应
         document_id: 这些块所属的文档ID
         namespace: 使用的 Pinecone 命名空间
+        on_failure: 可选的失败回调，参数为 (批次起始位置, 批次文本块列表)，默认记录日志
         
     Returns:
-        Tuple 包含: (成功的向量 ID 列表, 失败的文本块列表)
+        Tuple 包含: (成功的向量 ID 列表, 失败的文本块数量)
     """
-    from openai import OpenAI
-    
     # 检查参数
-    if not texts:
-        return ([], [])
-    
-    if len(texts) != len(metadatas):
-        raise ValueError(f"texts 和 metadatas 长度不匹配: {len(texts)} vs {len(metadatas)}")
-    
-    # 初始化 OpenAI 客户端
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    if isinstance(texts, Sized) and isinstance(metadatas, Sized):
+        if not texts:
+            return ([], 0)
+        if len(texts) != len(metadatas):
+            raise ValueError(f"texts 和 metadatas 长度不匹配: {len(texts)} vs {len(metadatas)}")
     
     # 初始化 Pinecone 索引
     index = get_pinecone_index()
     
-    # 批处理大小，避免一次处理太多文本
-    batch_size = 100
+    # 每组文本块的数量：一组内的嵌入请求并发进行
+    batch_size = max(1, settings.EMBED_BATCH_SIZE) * max(1, settings.EMBED_CONCURRENCY)
+    upsert_batch_size = max(1, settings.PINECONE_UPSERT_BATCH_SIZE)
+    # 同时等待完成的 upsert 请求上限，避免上传变慢时向量在内存中堆积
+    max_pending_upserts = max(1, settings.PINECONE_POOL_THREADS) * 2
     successful_ids = []
-    failed_texts = []
+    failed_count = 0
     
-    # 分批处理
-    for batch_start in range(0, len(texts), batch_size):
-        batch_end = min(batch_start + batch_size, len(texts))
-        batch_texts = texts[batch_start:batch_end]
-        batch_metadatas = metadatas[batch_start:batch_end]
-        
+    # 按批次读取 (文本, 元数据)
+    pairs = zip(texts, metadatas)
+    # 读取输入时（例如生成文本块的迭代器）出现的异常，已读取部分处理完后重新抛出
+    input_error: Optional[Exception] = None
+    
+    def next_batch() -> List[Tuple[str, Dict[str, Any]]]:
+        nonlocal input_error
+        if input_error is not None:
+            return []
         try:
-            logger.info(f"为文档 {document_id} 生成嵌入向量, 批次 {batch_start//batch_size + 1}/{(len(texts)+batch_size-1)//batch_size}")
-            
-            # 为所有文本生成嵌入
-            response = client.embeddings.create(
-                input=batch_texts,
-                model="text-embedding-3-small"
-            )
-            
-            embeddings = [embedding.embedding for embedding in response.data]
-            
-            # 准备向量进行上传
-            vector_ids = []
-            vectors = []
+            return list(islice(pairs, batch_size))
+        except Exception as e:
+            input_error = e
+            return []
+    
+    # 嵌入生成（生产者）和向量上传（消费者）之间的有界队列，
+    # 元素为 (批次起始位置, 批次 (文本, 元数据) 列表, 嵌入向量列表, 错误)
+    batch_queue: queue.Queue = queue.Queue(maxsize=EMBED_QUEUE_MAXSIZE)
+    # 已提交的并行 upsert：(异步结果, 起始位置, 向量 ID 列表, 文本块列表)
+    pending_upserts: deque = deque()
+    
+    def record_failure(batch_start: int, batch_texts: List[str], error: Exception) -> None:
+        nonlocal failed_count
+        batch_end = batch_start + len(batch_texts)
+        logger.error(f"文本块 {batch_start}-{batch_end - 1} 向量处理失败: {str(error)}")
+        failed_count += len(batch_texts)
+        if on_failure:
+            try:
+                on_failure(batch_start, batch_texts)
+            except Exception as callback_error:
+                logger.error(f"记录失败批次时出错: {str(callback_error)}")
+        else:
+            logger.warning(f"文档 {document_id} 的文本块 {batch_start}-{batch_end - 1} 未能写入向量存储")
+    
+    def wait_oldest_upsert() -> None:
+        async_result, upsert_start, vector_ids, upsert_texts = pending_upserts.popleft()
+        try:
+            async_result.get()
+            successful_ids.extend(vector_ids)
+        except Exception as e:
+            record_failure(upsert_start, upsert_texts, e)
+    
+    # 生产者已经读取的文本块数量
+    produced_until = 0
+    
+    async def produce_embeddings_async() -> None:
+        nonlocal produced_until
+        # 生产者线程有自己的事件循环，在该循环中创建 HTTP/2 异步客户端，不与主事件循环共享连接
+        async with create_async_openai_client() as client:
+            while batch := next_batch():
+                batch_start = produced_until
+                produced_until += len(batch)
+                try:
+                    logger.info(f"为文档 {document_id} 生成嵌入向量, 批次 {batch_start//batch_size + 1}")
+                    embeddings = await embed_batches([text for text, _ in batch], client)
+                    batch_queue.put((batch_start, batch, embeddings, None))
+                except Exception as e:
+                    batch_queue.put((batch_start, batch, None, e))
+    
+    def produce_embeddings() -> None:
+        nonlocal produced_until
+        try:
+            asyncio.run(produce_embeddings_async())
+        except Exception as e:
+            # 客户端创建失败等情况：剩余的文本块全部记为失败
+            while batch := next_batch():
+                batch_queue.put((produced_until, batch, None, e))
+                produced_until += len(batch)
+        finally:
+            # 结束标记
+            batch_queue.put(None)
+    
+    producer = threading.Thread(target=produce_embeddings, name=f"embed-doc-{document_id}", daemon=True)
+    producer.start()
+    
+    while True:
+        item = batch_queue.get()
+        if item is None:
+            break
+        
+        batch_start, batch, embeddings, error = item
+        
+        if error is not None:
+            record_failure(batch_start, [text for text, _ in batch], error)
+            continue
+        
+        # 准备向量进行上传
+        vector_ids = []
+        vectors = []
+        
+        for i, ((text, metadata), embedding) in enumerate(zip(batch, embeddings)):
+            chunk_index = batch_start + i
             
-            for i, (text, metadata, embedding) in enumerate(zip(batch_texts, batch_metadatas, embeddings)):
-                # 创建唯一的向量 ID
-                vector_id = f"doc_{document_id}_chunk_{batch_start + i}"
-                vector_ids.append(vector_id)
-                
-                # 将文本添加到元数据中以便检索
-                metadata_copy = metadata.copy()
-                metadata_copy["text"] = text
-                metadata_copy["document_id"] = document_id
-                
-                # 准备向量元组
-                vector = (vector_id, embedding, metadata_copy)
-                vectors.append(vector)
+            # 创建唯一的向量 ID
+            vector_id = f"doc_{document_id}_chunk_{chunk_index}"
+            vector_ids.append(vector_id)
             
-            # 将向量上传到 Pinecone
-            logger.info(f"向 Pinecone 上传 {len(vectors)} 个向量")
-            index.upsert(vectors=vectors, namespace=namespace)
+            # 将文本添加到元数据中以便检索
+            metadata_copy = metadata.copy()
+            metadata_copy["text"] = text
+            metadata_copy["document_id"] = document_id
             
-            successful_ids.extend(vector_ids)
+            # 准备向量元组
+            vectors.append((vector_id, embedding, metadata_copy))
+        
+        # 按 upsert_batch_size 分批并行上传到 Pinecone，不等待上一批完成
+        logger.info(f"向 Pinecone 上传 {len(vectors)} 个向量")
+        for offset in range(0, len(vectors), upsert_batch_size):
+            upsert_start = batch_start + offset
+            batch_ids = vector_ids[offset:offset + upsert_batch_size]
+            upsert_texts = [text for text, _ in batch[offset:offset + upsert_batch_size]]
+            try:
+                async_result = index.upsert(
+                    vectors=vectors[offset:offset + upsert_batch_size],
+                    namespace=namespace,
+                    async_req=True
+                )
+            except Exception as e:
+                record_failure(upsert_start, upsert_texts, e)
+                continue
             
-        except Exception as e:
-            logger.error(f"批次 {batch_start//batch_size + 1} 向量处理失败: {str(e)}")
-            failed_texts.extend(batch_texts)
+            pending_upserts.append((async_result, upsert_start, batch_ids, upsert_texts))
+            if len(pending_upserts) >= max_pending_upserts:
+                wait_oldest_upsert()
+    
+    # 等待剩余的 upsert 完成
+    while pending_upserts:
+        wait_oldest_upsert()
+    
+    producer.join()
     
-    logger.info(f"文档 {document_id} 向量处理完成: {len(successful_ids)} 成功, {len(failed_texts)} 失败")
-    return (successful_ids, failed_texts)
+    if input_error is not None:
+        logger.error(f"读取文档 {document_id} 的文本块失败: {str(input_error)}")
+        raise input_error
+    
+    logger.info(f"文档 {document_id} 向量处理完成: {len(successful_ids)} 成功, {failed_count} 失败")
+    return (successful_ids, failed_count)
 
-def search_vectors(query: str, top_k: int = 5, namespace: str = "default", filter_dict: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+def search_vectors(query: str, top_k: int = 5, namespace: str = "default", filter_dict: Optional[Dict[str, Any]] = None, client: Optional[OpenAI] = None) -> List[Dict[str, Any]]:
     """
     基于查询字符串搜索相似向量
     
+    并发的相同查询（查询、top_k、命名空间和过滤条件都相同）只会执行一次，
+    其余调用等待第一次调用的结果；每个调用得到各自的深拷贝，修改结果不会影响其他调用
+    
     Args:
         query: 查询字符串
         top_k: 返回结果数量
         namespace: 搜索的 Pinecone 命名空间
         filter_dict: 可选的过滤条件
+        client: 可选的 OpenAI 客户端，默认使用共享客户端
         
     Returns:
         包含搜索结果的字典列表
     """
-    from openai import OpenAI
+    key = (query, top_k, namespace, json.dumps(filter_dict, sort_keys=True, default=str))
+    
+    with _inflight_searches_lock:
+        future = _inflight_searches.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _inflight_searches[key] = future
     
+    if not is_leader:
+        # 等待正在执行的相同查询
+        return copy.deepcopy(future.result())
+    
+    try:
+        results = _search_vectors(query, top_k, namespace, filter_dict, client)
+        future.set_result(results)
+        return copy.deepcopy(results)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_searches_lock:
+            _inflight_searches.pop(key, None)
+
+def _search_vectors(query: str, top_k: int, namespace: str, filter_dict: Optional[Dict[str, Any]], client: Optional[OpenAI]) -> List[Dict[str, Any]]:
+    """
+    执行向量搜索（不合并并发查询）
+    
+    Args:
+        query: 查询字符串
+        top_k: 返回结果数量
+        namespace: 搜索的 Pinecone 命名空间
+        filter_dict: 可选的过滤条件
+        client: 可选的 OpenAI 客户端，默认使用共享客户端
+        
+    Returns:
+        包含搜索结果的字典列表
+    """
     # 验证输入
     if not query or not query.strip():
         return []
         
     # 处理特殊查询，如明确要求附件内容
-    is_attachment_query = False
-    if "附件" in query or "attachment" in query.lower():
-        is_attachment_query = True
+    is_attachment_query = _ATTACHMENT_QUERY_RE.search(query) is not None
+    if is_attachment_query:
         # 修改查询语句，增加对附件内容的匹配权重
         query = query + " 附件 attachment"
     
-    # 初始化 OpenAI 客户端
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    # 获取 OpenAI 客户端
+    client = client or get_openai_client()
     
     try:
         # 初始化 Pinecone 索引
@@ -391,7 +644,8 @@ def search_vectors(query: str, top_k: int = 5, namespace: str = "default", filte
         # 为查询生成嵌入
         response = client.embeddings.create(
             input=[query],
-            model="text-embedding-3-small"
+            model=EMBEDDING_MODEL,
+            dimensions=settings.EMBED_DIMENSIONS
         )
         
         query_embedding = response.data[0].embedding
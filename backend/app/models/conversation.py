@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, SmallInteger, Index, MetaData, Table
+from sqlalchemy.ext.hybrid import hybrid_property, Comparator
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
 from app.db.base import Base
@@ -9,21 +11,98 @@ class SenderType(str, enum.Enum):
     AI = "AI"
     SYSTEM = "SYSTEM"
 
+class SenderTypeCode(enum.IntEnum):
+    """消息发送者类型在数据库中的存储编码（SMALLINT）"""
+    USER = 1
+    AI = 2
+    SYSTEM = 3
+
+# 发送者类型与存储编码的映射，只在访问属性或构建查询条件时使用
+SENDER_TYPE_CODES = {SenderType[code.name]: int(code) for code in SenderTypeCode}
+_SENDER_TYPE_BY_CODE = {code: sender_type for sender_type, code in SENDER_TYPE_CODES.items()}
+
+class SenderTypeComparator(Comparator):
+    """在查询中将 SenderType 转换为存储编码进行比较"""
+    def operate(self, op, *other, **kwargs):
+        codes = [self._to_code(value) for value in other]
+        return op(self.__clause_element__(), *codes, **kwargs)
+
+    @staticmethod
+    def _to_code(value):
+        # in_() 等操作传入的是值列表
+        if isinstance(value, (list, tuple, set)):
+            return [SENDER_TYPE_CODES[SenderType(item)] for item in value]
+        return SENDER_TYPE_CODES[SenderType(value)]
+
 class Conversation(Base):
     __tablename__ = "conversations"
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")  # 消息数量（随消息写入维护）
+    last_message_at = Column(DateTime(timezone=True), nullable=True)  # 最后一条消息的时间
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # 删除对话时由数据库通过 ON DELETE CASCADE 删除消息，ORM 不再逐条加载和删除
+    messages = relationship(
+        "Message",
+        cascade="all, delete-orphan",
+        passive_deletes=True
+    )
 
 class Message(Base):
     __tablename__ = "messages"
     
     id = Column(Integer, primary_key=True, index=True)
-    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
     content = Column(Text, nullable=False)
-    sender_type = Column(Enum(SenderType), nullable=False)
+    # 数据库列名为 sender_type，存储编码：1=USER, 2=AI, 3=SYSTEM
+    sender_code = Column("sender_type", SmallInteger, nullable=False)
     sender_id = Column(Integer, nullable=True)  # Can reference either user or ai_executive
-    created_at = Column(DateTime(timezone=True), server_default=func.now()) 
\ No newline at end of file
+    # 使用 clock_timestamp()：同一事务中写入的用户消息和AI回复时间不同，保证按时间排序的顺序
+    created_at = Column(DateTime(timezone=True), server_default=func.clock_timestamp())
+
+    __table_args__ = (
+        # 按对话读取消息并按时间排序时直接走索引，省去排序；
+        # INCLUDE 发送者字段，读取消息元数据时可以只扫描索引（PostgreSQL 11+）
+        Index(
+            "ix_messages_conv_created",
+            "conversation_id",
+            "created_at",
+            postgresql_include=["sender_type", "sender_id"]
+        ),
+    )
+
+    @hybrid_property
+    def sender_type(self) -> SenderType:
+        """发送者类型（读取结果时不做逐行转换，访问属性时才映射为枚举）"""
+        return _SENDER_TYPE_BY_CODE[self.sender_code]
+
+    @sender_type.setter
+    def sender_type(self, value) -> None:
+        self.sender_code = SENDER_TYPE_CODES[SenderType(value)]
+
+    @sender_type.comparator
+    def sender_type(cls) -> SenderTypeComparator:
+        return SenderTypeComparator(cls.sender_code)
+
+# 物化视图不属于 Base.metadata，避免 create_all 和 Alembic 自动生成把它当作普通表创建；
+# 视图由迁移创建，通过 REFRESH MATERIALIZED VIEW 更新
+_view_metadata = MetaData()
+
+class ConversationSummary(Base):
+    """对话摘要（只读，映射物化视图 conversation_summary）"""
+    __table__ = Table(
+        "conversation_summary",
+        _view_metadata,
+        Column("id", Integer, primary_key=True),
+        Column("title", String),
+        Column("user_id", Integer),
+        Column("created_at", DateTime(timezone=True)),
+        Column("updated_at", DateTime(timezone=True)),
+        Column("msg_count", Integer),
+        Column("last_message_at", DateTime(timezone=True)),
+        Column("last_snippet", Text),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.sql import func
 from app.db.base import Base
 
@@ -13,11 +13,19 @@ class Document(Base):
     text_content = Column(Text, nullable=True)  # 将content重命名为text_content
     vector_ids = Column(Text, nullable=True)  # Comma-separated list of vector IDs in Pinecone
     uploaded_by = Column(Integer, ForeignKey("users.id"), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)  # 文档列表按创建时间倒序分页
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     processing_status = Column(String, default="pending")  # pending, processing, completed, error
     processing_error = Column(Text, nullable=True)  # 存储处理错误信息
     filename = Column(String, nullable=True)  # 文件名
     file_size = Column(Integer, default=0)  # 文件大小
     is_processed = Column(Boolean, default=False)  # 处理完成标志
-    vectorized = Column(Boolean, default=False)  # 向量化标志 
\ No newline at end of file
+    vectorized = Column(Boolean, default=False)  # 向量化标志
+    file_sha256 = Column(String(64), nullable=True)  # 文件内容 SHA-256，用于识别同一用户的重复上传
+    claimed_at = Column(DateTime(timezone=True), nullable=True)  # 处理 worker 的租约时间，处理期间定期续期
+    
+    __table_args__ = (
+        # 同一用户的相同文件只保留一条有效记录；不同用户上传相同文件各自独立
+        Index("ix_documents_uploaded_by_file_sha256", "uploaded_by", "file_sha256", unique=True),
+    )
+ 
\ No newline at end of file
@@ -41,4 +41,14 @@ class AIExecutive(AIExecutiveInDBBase):
 
 class AIExecutiveResponse(AIExecutiveInDBBase):
     """AI高管详细响应模型"""
-    pass 
\ No newline at end of file
+    pass
+
+class AIExecutiveSummary(BaseModel):
+    """AI高管简要信息（用于下拉列表等）"""
+    id: int
+    name: str
+    role: str
+    is_active: Optional[bool] = None
+
+    class Config:
+        from_attributes = True 
\ No newline at end of file
@@ -65,6 +65,17 @@ class Conversation(ConversationInDBBase):
     """API响应中的对话模型"""
     pass
 
+class ConversationSummary(BaseModel):
+    """对话摘要模型（侧边栏列表）"""
+    id: int
+    title: Optional[str] = None
+    user_id: int
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    msg_count: int = 0
+    last_message_at: Optional[datetime] = None
+    last_snippet: Optional[str] = None
+
 class ConversationWithMessages(Conversation):
     """包含消息的对话模型"""
     messages: List[MessageResponse] = []
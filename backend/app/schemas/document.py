@@ -47,6 +47,7 @@ class DocumentCreateResponse(BaseModel):
     created_at: datetime
     processing_status: str
     message: str
+    duplicate: bool = False  # 是否为同一用户已上传过的相同文件（返回已有文档，本次的标题和描述未保存）
     
     class Config:
         from_attributes = True
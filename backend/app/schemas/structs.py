@@ -0,0 +1,53 @@
+"""
+高频响应的 msgspec 结构体
+
+字段与对应的 Pydantic 响应模型保持一致，用于直接从数据库数据构建并序列化响应（不做校验）；
+请求解析仍然使用 Pydantic 模型
+"""
+from typing import List, Optional
+from datetime import datetime
+import msgspec
+
+from app.models.conversation import SenderType
+
+class MessageResponseStruct(msgspec.Struct):
+    """消息响应（对应 MessageResponse）"""
+    id: int
+    content: str
+    sender_type: SenderType
+    sender_id: Optional[int]
+    created_at: datetime
+    sender_name: Optional[str] = None
+    sender_role: Optional[str] = None
+
+class ConversationStruct(msgspec.Struct):
+    """对话响应（对应 Conversation）"""
+    id: int
+    title: Optional[str]
+    user_id: int
+    created_at: datetime
+    updated_at: Optional[datetime]
+
+class ConversationWithMessagesStruct(ConversationStruct):
+    """包含消息的对话响应（对应 ConversationWithMessages）"""
+    messages: List[MessageResponseStruct] = []
+
+class ConversationSummaryStruct(msgspec.Struct):
+    """对话摘要响应（对应 ConversationSummary）"""
+    id: int
+    title: Optional[str]
+    user_id: int
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    msg_count: int
+    last_message_at: Optional[datetime]
+    last_snippet: Optional[str]
+
+class DocumentSearchResponseStruct(msgspec.Struct):
+    """文档搜索响应（对应 DocumentSearchResponse）"""
+    id: int
+    title: str
+    content_type: str
+    created_at: datetime
+    processing_status: str
+    description: Optional[str] = None
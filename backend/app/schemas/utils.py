@@ -0,0 +1,19 @@
+from typing import Any, Type, TypeVar
+from pydantic import BaseModel
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+def build_from_orm(cls: Type[ModelT], orm_obj: Any, **overrides: Any) -> ModelT:
+    """
+    从数据库 ORM 对象构建响应模型
+    
+    数据库中的数据是可信的，使用 model_construct 跳过字段校验；
+    ORM 对象上不存在的字段使用模型默认值，overrides 中的值优先
+    """
+    values = {
+        field: getattr(orm_obj, field)
+        for field in cls.model_fields
+        if field not in overrides and hasattr(orm_obj, field)
+    }
+    values.update(overrides)
+    return cls.model_construct(**values)
@@ -1,10 +1,44 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Mapping, Tuple
+from types import MappingProxyType
+import threading
+import time
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 
 from app.models.ai_executive import AIExecutive
 from app.schemas.ai_executive import AIExecutiveCreate, AIExecutiveUpdate
 
+# AI高管配置很少变化，查询结果在进程内缓存一段时间
+EXECUTIVE_CACHE_TTL_SECONDS = 300
+ACTIVE_EXECUTIVES_CACHE_TTL_SECONDS = 30
+# 按角色缓存的AI高管数量上限
+EXECUTIVE_BY_ROLE_CACHE_MAX_SIZE = 64
+
+# 活跃AI高管查询，模块级语句可以复用 SQLAlchemy 的编译缓存
+_ACTIVE_EXECUTIVES_STMT = select(AIExecutive).where(AIExecutive.is_active == True)
+
+# 全局变量：角色 -> (缓存时间, 不绑定会话的AI高管快照)，只缓存存在的角色，按写入顺序排列
+_executive_by_role_cache: Dict[str, Tuple[float, AIExecutive]] = {}
+# 全局变量：(缓存时间, 活跃AI高管快照列表)
+_active_executives_cache: Optional[Tuple[float, List[AIExecutive]]] = None
+_executive_cache_lock = threading.Lock()
+
+def _snapshot_executive(executive: AIExecutive) -> AIExecutive:
+    """复制为不绑定数据库会话的AI高管对象，可以在请求之间安全共享"""
+    return AIExecutive(**{
+        column.key: getattr(executive, column.key)
+        for column in AIExecutive.__table__.columns
+    })
+
+def invalidate_ai_executive_cache() -> None:
+    """清空AI高管缓存，在高管信息变更后调用"""
+    global _active_executives_cache
+    
+    with _executive_cache_lock:
+        _executive_by_role_cache.clear()
+        _active_executives_cache = None
+
 def create_ai_executive(
     db: Session, 
     executive: AIExecutiveCreate, 
@@ -22,6 +56,7 @@ def create_ai_executive(
     db.add(db_executive)
     db.commit()
     db.refresh(db_executive)
+    invalidate_ai_executive_cache()
     return db_executive
 
 def get_ai_executive(db: Session, executive_id: int) -> Optional[AIExecutive]:
@@ -29,8 +64,36 @@ def get_ai_executive(db: Session, executive_id: int) -> Optional[AIExecutive]:
     return db.query(AIExecutive).filter(AIExecutive.id == executive_id).first()
 
 def get_ai_executive_by_role(db: Session, role: str) -> Optional[AIExecutive]:
-    """通过角色获取AI高管"""
-    return db.query(AIExecutive).filter(AIExecutive.role == role).filter(AIExecutive.is_active == True).first()
+    """
+    通过角色获取AI高管
+    
+    结果缓存 EXECUTIVE_CACHE_TTL_SECONDS 秒，返回的是不绑定会话的只读快照；
+    role 可能来自请求路径或 LLM 输出，查不到的角色不缓存，缓存条目数不超过 EXECUTIVE_BY_ROLE_CACHE_MAX_SIZE
+    """
+    now = time.monotonic()
+    cached = _executive_by_role_cache.get(role)
+    if cached:
+        if now - cached[0] < EXECUTIVE_CACHE_TTL_SECONDS:
+            return cached[1]
+        with _executive_cache_lock:
+            _executive_by_role_cache.pop(role, None)
+
+    executive = db.query(AIExecutive).filter(AIExecutive.role == role).filter(AIExecutive.is_active == True).first()
+    if not executive:
+        return None
+    snapshot = _snapshot_executive(executive)
+    
+    with _executive_cache_lock:
+        # 重新插入到末尾，字典顺序即写入时间顺序
+        _executive_by_role_cache.pop(role, None)
+        # 删除过期条目，仍然超过上限时淘汰最早写入的条目
+        for key, (cached_at, _) in list(_executive_by_role_cache.items()):
+            if now - cached_at >= EXECUTIVE_CACHE_TTL_SECONDS:
+                del _executive_by_role_cache[key]
+        while len(_executive_by_role_cache) >= EXECUTIVE_BY_ROLE_CACHE_MAX_SIZE:
+            del _executive_by_role_cache[next(iter(_executive_by_role_cache))]
+        _executive_by_role_cache[role] = (now, snapshot)
+    return snapshot
 
 def get_ai_executives(
     db: Session, 
@@ -44,6 +107,50 @@ def get_ai_executives(
         query = query.filter(AIExecutive.is_active == True)
     return query.offset(skip).limit(limit).all()
 
+def get_ai_executive_summaries(
+    db: Session, 
+    skip: int = 0, 
+    limit: int = 100, 
+    active_only: bool = False
+) -> List[Any]:
+    """
+    获取AI高管简要列表（id、名称、角色、是否活跃）
+    
+    只查询列表展示需要的列，不加载 prompt_template 等大文本字段
+    """
+    query = db.query(AIExecutive).with_entities(
+        AIExecutive.id,
+        AIExecutive.name,
+        AIExecutive.role,
+        AIExecutive.is_active
+    )
+    if active_only:
+        query = query.filter(AIExecutive.is_active == True)
+    return query.order_by(AIExecutive.id).offset(skip).limit(limit).all()
+
+def get_active_ai_executives(db: Session) -> List[AIExecutive]:
+    """
+    获取所有活跃的AI高管
+    
+    结果缓存 ACTIVE_EXECUTIVES_CACHE_TTL_SECONDS 秒，返回的是不绑定会话的只读快照；
+    需要关联到会话时使用 db.merge(executive, load=False)
+    """
+    global _active_executives_cache
+    
+    now = time.monotonic()
+    cached = _active_executives_cache
+    if cached and now - cached[0] < ACTIVE_EXECUTIVES_CACHE_TTL_SECONDS:
+        return list(cached[1])
+    
+    executives = [
+        _snapshot_executive(executive)
+        for executive in db.execute(_ACTIVE_EXECUTIVES_STMT).scalars()
+    ]
+    
+    with _executive_cache_lock:
+        _active_executives_cache = (now, executives)
+    return list(executives)
+
 def update_ai_executive(
     db: Session, 
     executive_id: int, 
@@ -60,6 +167,7 @@ def update_ai_executive(
     
     db.commit()
     db.refresh(db_executive)
+    invalidate_ai_executive_cache()
     return db_executive
 
 def delete_ai_executive(db: Session, executive_id: int) -> bool:
@@ -70,11 +178,12 @@ def delete_ai_executive(db: Session, executive_id: int) -> bool:
     
     db_executive.is_active = False
     db.commit()
+    invalidate_ai_executive_cache()
     return True
 
-def get_default_executives() -> List[Dict[str, Any]]:
-    """获取默认AI高管配置"""
-    return [
+# 默认AI高管配置（只读，模块加载时构建一次）
+_DEFAULT_EXECUTIVES: Tuple[Mapping[str, str], ...] = tuple(
+    MappingProxyType(executive) for executive in (
         {
             "name": "AI首席执行官",
             "role": "CEO",
@@ -190,12 +299,17 @@ def get_default_executives() -> List[Dict[str, Any]]:
             针对法律相关问题，提供谨慎、全面且合规的建议，同时确保建议具有实用性和可操作性。
             """
         }
-    ]
+    )
+)
+
+def get_default_executives() -> Tuple[Mapping[str, str], ...]:
+    """获取默认AI高管配置"""
+    return _DEFAULT_EXECUTIVES
 
 def initialize_default_executives(db: Session) -> None:
     """初始化默认AI高管配置"""
     # 检查是否已存在高管
-    existing = get_ai_executives(db)
+    existing = db.query(AIExecutive.id).first()
     if existing:
         return  # 已有高管配置，无需初始化
     
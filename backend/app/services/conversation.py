@@ -1,16 +1,161 @@
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+import logging
+import threading
+import time
+from sqlalchemy import select, insert, update, func, and_, text
 from sqlalchemy.orm import Session
 
-from app.models.conversation import Conversation, Message, SenderType
+from app.models.conversation import Conversation, ConversationSummary, Message, SenderType, SENDER_TYPE_CODES
 from app.models.user import User
+from app.models.ai_executive import AIExecutive
 from app.schemas.conversation import (
     ConversationCreate,
     ConversationUpdate,
     MessageCreate
 )
 from app.ai.executive_engine import ExecutiveEngine
-from app.services.ai_executive import get_ai_executives, get_ai_executive_by_role
+from app.db.base import SessionLocal, engine as db_engine
+from app.services.ai_executive import get_active_ai_executives, get_ai_executive_by_role
+
+# 设置日志记录器
+logger = logging.getLogger(__name__)
+
+# 消息长度限制和截断后追加的提示
+MAX_USER_CONTENT_LENGTH = 8000
+USER_CONTENT_TRUNCATED_SUFFIX = "... [内容过长，已截断]"
+MAX_AI_RESPONSE_LENGTH = 24000
+AI_RESPONSE_TRUNCATED_SUFFIX = "\n\n[回复过长，部分内容已被截断]"
+# 根据首条消息生成标题时使用的字符数
+TITLE_PREFIX_LENGTH = 20
+
+# 对话摘要物化视图的刷新延迟：这段时间内的多次写入合并为一次刷新
+SUMMARY_REFRESH_DELAY_SECONDS = 5.0
+# 刷新物化视图使用的 PostgreSQL advisory lock 键：多个应用进程之间每个刷新间隔只有一个进程执行刷新
+SUMMARY_REFRESH_LOCK_KEY = 720415
+
+# 全局变量：等待执行的物化视图刷新任务
+_summary_refresh_timer: Optional[threading.Timer] = None
+_summary_refresh_lock = threading.Lock()
+
+# ExecutiveEngine 缓存：同一对话的多轮消息复用已创建的高管代理
+ENGINE_CACHE_MAX_SIZE = 1024
+ENGINE_CACHE_TTL_SECONDS = 1800
+
+# 全局变量：(用户ID, 对话ID) -> (创建时间, 高管配置指纹, 引擎实例)
+_engine_cache: Dict[Tuple[int, int], Tuple[float, int, ExecutiveEngine]] = {}
+_engine_cache_lock = threading.Lock()
+
+def _executives_fingerprint(executives: List[Any]) -> int:
+    """根据高管配置计算指纹，高管信息变更后指纹随之变化"""
+    return hash(tuple(
+        (
+            executive.id,
+            executive.name,
+            executive.role,
+            executive.description,
+            executive.prompt_template,
+            executive.updated_at
+        )
+        for executive in executives
+    ))
+
+def get_executive_engine(
+    executives: List[Any],
+    user_id: int,
+    conversation_id: int
+) -> ExecutiveEngine:
+    """
+    获取对话使用的AI执行引擎
+    
+    引擎按 (用户ID, 对话ID) 缓存 ENGINE_CACHE_TTL_SECONDS 秒，避免每轮消息都重新创建高管代理和 LLM 客户端；
+    活跃高管列表或其配置发生变化时重新创建
+    
+    Args:
+        executives: 活跃的AI高管列表
+        user_id: 用户ID
+        conversation_id: 对话ID
+        
+    Returns:
+        AI执行引擎
+    """
+    key = (user_id, conversation_id)
+    fingerprint = _executives_fingerprint(executives)
+    now = time.monotonic()
+    
+    cached = _engine_cache.get(key)
+    if cached and cached[1] == fingerprint and now - cached[0] < ENGINE_CACHE_TTL_SECONDS:
+        return cached[2]
+    
+    engine = ExecutiveEngine(
+        executives=executives,
+        user_id=user_id,
+        conversation_id=conversation_id
+    )
+    
+    with _engine_cache_lock:
+        _engine_cache.pop(key, None)
+        if len(_engine_cache) >= ENGINE_CACHE_MAX_SIZE:
+            # 先清理过期条目，仍然已满时淘汰最早创建的引擎
+            expired = [k for k, v in _engine_cache.items() if now - v[0] >= ENGINE_CACHE_TTL_SECONDS]
+            for k in expired:
+                del _engine_cache[k]
+            while len(_engine_cache) >= ENGINE_CACHE_MAX_SIZE:
+                del _engine_cache[next(iter(_engine_cache))]
+        _engine_cache[key] = (now, fingerprint, engine)
+    return engine
+
+def _refresh_conversation_summary() -> None:
+    """
+    刷新对话摘要物化视图（CONCURRENTLY，不阻塞读取）
+    
+    每个应用进程都有自己的刷新定时器；刷新前在单独的连接上开启事务并获取事务级 advisory lock，
+    刷新完成后继续持有到 SUMMARY_REFRESH_DELAY_SECONDS 结束，所有进程合计每个间隔最多刷新一次
+    （事务级锁在 PgBouncer transaction 模式下同样有效）；
+    没有获取到锁的进程稍后重试，保证它写入的数据也会出现在视图中
+    """
+    global _summary_refresh_timer
+    
+    with _summary_refresh_lock:
+        _summary_refresh_timer = None
+    
+    started = time.monotonic()
+    try:
+        # 锁连接上的事务在退出时回滚，同时释放锁
+        with db_engine.connect() as lock_conn:
+            locked = lock_conn.execute(
+                text("SELECT pg_try_advisory_xact_lock(:key)"),
+                {"key": SUMMARY_REFRESH_LOCK_KEY}
+            ).scalar()
+            if not locked:
+                # 其他进程正在刷新或刚刷新过，稍后重试
+                schedule_conversation_summary_refresh()
+                return
+            
+            with SessionLocal() as db:
+                db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY conversation_summary"))
+                db.commit()
+            
+            # 持有锁直到本次刷新间隔结束，其他进程在这段时间内不会重复刷新
+            remaining = SUMMARY_REFRESH_DELAY_SECONDS - (time.monotonic() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+    except Exception as e:
+        logger.error(f"刷新对话摘要视图失败: {str(e)}")
+
+def schedule_conversation_summary_refresh() -> None:
+    """
+    在后台延迟刷新对话摘要物化视图
+    
+    SUMMARY_REFRESH_DELAY_SECONDS 秒内的多次调用只触发一次刷新
+    """
+    global _summary_refresh_timer
+    
+    with _summary_refresh_lock:
+        if _summary_refresh_timer is not None:
+            return
+        _summary_refresh_timer = threading.Timer(SUMMARY_REFRESH_DELAY_SECONDS, _refresh_conversation_summary)
+        _summary_refresh_timer.daemon = True
+        _summary_refresh_timer.start()
 
 async def create_conversation(
     db: Session, 
@@ -18,15 +163,15 @@ async def create_conversation(
     user_id: int
 ) -> Conversation:
     """创建新的对话"""
+    # created_at/updated_at 由数据库默认值生成
     db_obj = Conversation(
         title=obj_in.title,
-        user_id=user_id,
-        created_at=datetime.now(),
-        updated_at=datetime.now()
+        user_id=user_id
     )
     db.add(db_obj)
     db.commit()
     db.refresh(db_obj)
+    schedule_conversation_summary_refresh()
     return db_obj
 
 def get_conversation(db: Session, conversation_id: int) -> Optional[Conversation]:
@@ -49,14 +194,34 @@ def get_conversations(
         .all()
     )
 
+def get_conversation_summaries(
+    db: Session, 
+    user_id: int, 
+    skip: int = 0, 
+    limit: int = 100
+) -> List[ConversationSummary]:
+    """
+    获取用户的对话摘要列表（消息数量、最后一条消息片段）
+    
+    从物化视图 conversation_summary 读取，数据在写入后 SUMMARY_REFRESH_DELAY_SECONDS 秒左右刷新
+    """
+    return (
+        db.query(ConversationSummary)
+        .filter(ConversationSummary.user_id == user_id)
+        .order_by(ConversationSummary.updated_at.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
 def update_conversation(
     db: Session, 
     db_obj: Conversation, 
     obj_in: ConversationUpdate
 ) -> Conversation:
     """更新对话信息"""
+    # updated_at 由列的 onupdate 在数据库中更新
     update_data = obj_in.dict(exclude_unset=True)
-    update_data["updated_at"] = datetime.now()
     
     for field, value in update_data.items():
         setattr(db_obj, field, value)
@@ -64,17 +229,17 @@ def update_conversation(
     db.add(db_obj)
     db.commit()
     db.refresh(db_obj)
+    schedule_conversation_summary_refresh()
     return db_obj
 
 def delete_conversation(db: Session, conversation_id: int) -> bool:
     """删除对话"""
     conversation = get_conversation(db, conversation_id)
     if conversation:
-        # 先删除所有相关消息
-        db.query(Message).filter(Message.conversation_id == conversation_id).delete()
-        # 再删除对话
+        # 相关消息由外键的 ON DELETE CASCADE 在数据库中删除
         db.delete(conversation)
         db.commit()
+        schedule_conversation_summary_refresh()
         return True
     return False
 
@@ -83,24 +248,36 @@ async def create_message(
     obj_in: MessageCreate,
     conversation_id: int
 ) -> Message:
-    """创建新消息"""
-    db_obj = Message(
-        conversation_id=conversation_id,
-        content=obj_in.content,
-        sender_type=obj_in.sender_type,
-        sender_id=obj_in.sender_id,
-        created_at=datetime.now()
-    )
-    db.add(db_obj)
+    """
+    创建新消息
     
-    # 更新对话的最后更新时间
-    conversation = get_conversation(db, conversation_id)
-    if conversation:
-        conversation.updated_at = datetime.now()
-        db.add(conversation)
+    只写入当前事务，由调用方负责提交；
+    消息通过 INSERT ... RETURNING 写入并直接取回数据库生成的 id 和 created_at，不需要再 refresh；
+    对话的消息数量和最后更新时间用一条 UPDATE 语句在数据库中更新，不需要先加载对话
+    """
+    db_obj = db.execute(
+        insert(Message)
+        .values(
+            conversation_id=conversation_id,
+            content=obj_in.content,
+            sender_code=SENDER_TYPE_CODES[SenderType(obj_in.sender_type)],
+            sender_id=obj_in.sender_id
+        )
+        .returning(Message)
+    ).scalar_one()
+    
+    # 更新对话的消息数量和最后更新时间
+    db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(
+            message_count=Conversation.message_count + 1,
+            last_message_at=func.clock_timestamp(),
+            updated_at=func.now()
+        )
+        .execution_options(synchronize_session=False)
+    )
     
-    db.commit()
-    db.refresh(db_obj)
     return db_obj
 
 def get_messages(
@@ -119,24 +296,102 @@ def get_messages(
         .all()
     )
 
+def get_messages_with_senders(
+    db: Session, 
+    conversation_id: int, 
+    skip: int = 0, 
+    limit: int = 100
+) -> List[Any]:
+    """
+    获取对话的消息及发送者信息
+    
+    通过一次外连接查询同时取出用户消息的用户名和AI消息的高管名称、角色，避免逐条查询发送者
+    
+    Args:
+        db: 数据库会话
+        conversation_id: 对话ID
+        skip: 跳过的消息数
+        limit: 返回的最大消息数
+        
+    Returns:
+        (消息, 发送者名称, 发送者角色) 行列表
+    """
+    stmt = (
+        select(
+            Message,
+            func.coalesce(AIExecutive.name, func.nullif(User.full_name, ""), User.email).label("sender_name"),
+            AIExecutive.role.label("sender_role")
+        )
+        .outerjoin(
+            User,
+            and_(Message.sender_type == SenderType.USER, Message.sender_id == User.id)
+        )
+        .outerjoin(
+            AIExecutive,
+            and_(Message.sender_type == SenderType.AI, Message.sender_id == AIExecutive.id)
+        )
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.created_at.asc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return db.execute(stmt).all()
+
+# 流式读取消息时每批从数据库游标获取的行数
+MESSAGE_STREAM_BATCH_SIZE = 100
+
+def iter_messages(db: Session, conversation_id: int) -> Iterator[Message]:
+    """
+    按时间顺序逐条返回对话的所有消息
+    
+    使用 yield_per 通过服务端游标分批读取，长对话也不会一次性把全部消息内容加载到内存
+    
+    Args:
+        db: 数据库会话
+        conversation_id: 对话ID
+        
+    Returns:
+        消息迭代器
+    """
+    stmt = (
+        select(Message)
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.created_at.asc())
+        .execution_options(yield_per=MESSAGE_STREAM_BATCH_SIZE)
+    )
+    for message in db.execute(stmt).scalars():
+        yield message
+
 async def process_user_message(
     db: Session,
     conversation_id: int,
     user_id: int,
-    content: str
+    content: str,
+    conversation: Optional[Conversation] = None
 ) -> Dict[str, Any]:
     """
     处理用户消息，获取AI执行团队的回复
     
     步骤：
-    1. 存储用户消息
+    1. 存储用户消息并立即提交，调用 LLM 期间不持有事务和行锁
     2. 使用AI执行引擎处理用户查询
-    3. 存储AI回复
-    4. 返回处理结果
+    3. 存储AI回复（如果是第一组消息，同时更新对话标题）
+    4. 提交AI回复，返回处理结果
+    
+    如果调用方已经加载了对话对象，可以通过 conversation 传入以避免重复查询
     """
     # 限制用户输入长度
-    if len(content) > 8000:
-        content = content[:8000] + "... [内容过长，已截断]"
+    if len(content) > MAX_USER_CONTENT_LENGTH:
+        content = content[:MAX_USER_CONTENT_LENGTH] + USER_CONTENT_TRUNCATED_SUFFIX
+    
+    # 获取对话信息
+    if conversation is None:
+        conversation = get_conversation(db, conversation_id)
+    
+    # 判断是否是第一组消息：保存用户消息之前对话中还没有消息；
+    # 如果是第一组消息，并且标题是默认的"新对话"或为空，之后根据内容生成标题
+    is_first_message = conversation.message_count == 0
+    title_updated = is_first_message and (conversation.title == "新对话" or not conversation.title)
     
     # 创建用户消息
     user_message = await create_message(
@@ -150,15 +405,20 @@ async def process_user_message(
     )
     
     # 获取所有活跃的AI高管
-    executives = get_ai_executives(db, active_only=True)
+    executives = get_active_ai_executives(db)
     
-    # 初始化AI执行引擎
-    engine = ExecutiveEngine(
+    # 获取AI执行引擎（同一对话复用）
+    engine = get_executive_engine(
         executives=executives,
         user_id=user_id,
         conversation_id=conversation_id
     )
     
+    # 调用 LLM 之前提交用户消息和对话计数器的更新，避免在整个 LLM 调用期间锁住对话行；
+    # 消息的字段已由 RETURNING 取回，提交前从会话中分离，避免提交后过期再 SELECT
+    db.expunge(user_message)
+    db.commit()
+    
     try:
         # 处理用户查询
         response = await engine.process_query(content)
@@ -182,15 +442,19 @@ async def process_user_message(
         
         # 确保AI回复是字符串
         if not isinstance(ai_response, str):
-            import logging
-            logger = logging.getLogger(__name__)
             logger.warning(f"AI回复不是字符串类型: {type(ai_response)}")
             # 强制转换为字符串
             ai_response = str(ai_response)
         
         # 限制回复长度
-        if len(ai_response) > 24000:
-            ai_response = ai_response[:24000] + "\n\n[回复过长，部分内容已被截断]"
+        if len(ai_response) > MAX_AI_RESPONSE_LENGTH:
+            ai_response = ai_response[:MAX_AI_RESPONSE_LENGTH] + AI_RESPONSE_TRUNCATED_SUFFIX
+        
+        new_title = None
+        if title_updated:
+            # 使用（已截断的）用户输入的前20个字符作为标题基础
+            new_title = content[:TITLE_PREFIX_LENGTH] + "..."
+            conversation.title = new_title
         
         # 创建AI回复消息
         ai_message = await create_message(
@@ -203,26 +467,10 @@ async def process_user_message(
             conversation_id=conversation_id
         )
         
-        # 获取对话信息
-        conversation = get_conversation(db, conversation_id)
-        
-        # 获取对话中的消息数量
-        message_count = db.query(Message).filter(Message.conversation_id == conversation_id).count()
-        
-        # 如果这是第一组消息（用户消息+AI回复，共2条消息），并且标题是默认的"新对话"或为空
-        is_first_message = message_count <= 2
-        
-        # 如果是第一组消息，根据内容生成标题
-        if is_first_message and (conversation.title == "新对话" or not conversation.title):
-            # 使用用户输入的前20个字符作为标题基础
-            new_title = content[:20] + "..."
-            
-            # 更新对话标题
-            update_conversation(
-                db=db,
-                db_obj=conversation,
-                obj_in=ConversationUpdate(title=new_title)
-            )
+        # AI回复和对话标题一次提交
+        db.expunge(ai_message)
+        db.commit()
+        schedule_conversation_summary_refresh()
         
         return {
             "user_message": user_message,
@@ -230,12 +478,10 @@ async def process_user_message(
             "primary_role": primary_role,
             "secondary_roles": response.get("secondary_roles", []),
             "reasoning": response.get("reasoning", ""),
-            "title_updated": is_first_message and (conversation.title == "新对话" or not conversation.title),
-            "new_title": new_title if is_first_message and (conversation.title == "新对话" or not conversation.title) else None
+            "title_updated": title_updated,
+            "new_title": new_title
         }
     except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
         logger.error(f"处理用户消息时出错: {str(e)}")
         
         # 确定使用的AI高管 - 出错时默认使用CEO
@@ -254,6 +500,10 @@ async def process_user_message(
             conversation_id=conversation_id
         )
         
+        db.expunge(ai_message)
+        db.commit()
+        schedule_conversation_summary_refresh()
+        
         return {
             "user_message": user_message,
             "ai_message": ai_message,
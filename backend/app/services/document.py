@@ -1,16 +1,22 @@
 import os
 import uuid
+import hashlib
 import logging
 import asyncio
-from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
-from fastapi import UploadFile, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
+import aiofiles
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from fastapi import UploadFile, HTTPException
+from sqlalchemy import select, update, or_, and_, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only
 
 from app.core.config import settings
+from app.db.base import SessionLocal
 from app.models.document import Document
 from app.knowledge.document_processor import (
     extract_text_from_file, 
+    iter_text_from_file,
     process_document,
     get_document_summary,
     SUPPORTED_EXTENSIONS
@@ -20,18 +26,60 @@ from app.knowledge.vector_store import delete_document_vectors, get_vector_store
 # 设置日志记录器
 logger = logging.getLogger(__name__)
 
+# 上传文件每次读取和写入的块大小（1MiB）
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# 数据库中保存全文的文档大小上限（约20页），更大的文档只保存摘要
+TEXT_CONTENT_MAX_CHARS = 100000
+
+# 没有新任务通知时，后台 worker 检查待处理文档的间隔
+DOCUMENT_WORKER_POLL_SECONDS = 30
+
+# 文档处理租约时长：processing 状态的文档超过这个时间没有续期，视为处理它的进程已经退出，可以被重新领取
+DOCUMENT_LEASE_SECONDS = 300
+
+# 处理期间续期租约的间隔，需要明显小于 DOCUMENT_LEASE_SECONDS
+DOCUMENT_LEASE_RENEW_SECONDS = 60
+
+# 重复上传时可以直接复用的已有文档状态：已完整处理，或仍在队列中/处理中；
+# 其他状态（error、partial、text_only）的文档没有完整的向量，重复上传时作为新文档重新处理
+_REUSABLE_DUPLICATE_STATUSES = ("pending", "processing", "completed")
+
+# 文档列表只加载响应需要的列，不读取 text_content 等大文本字段
+_DOCUMENT_LIST_COLUMNS = load_only(
+    Document.id,
+    Document.title,
+    Document.description,
+    Document.file_path,
+    Document.content_type,
+    Document.vector_ids,
+    Document.uploaded_by,
+    Document.created_at,
+    Document.updated_at,
+    Document.processing_status,
+    Document.processing_error
+)
+
 # 确保上传目录存在
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 
-async def save_upload_file(upload_file: UploadFile) -> Tuple[str, str]:
+# 全局变量：文档处理 worker 任务、新任务通知事件及其所属的事件循环
+_document_worker_task: Optional[asyncio.Task] = None
+_document_jobs_event: Optional[asyncio.Event] = None
+_document_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+async def save_upload_file(upload_file: UploadFile) -> Tuple[str, str, str]:
     """
     保存上传文件到磁盘
     
+    按 UPLOAD_CHUNK_SIZE 分块异步写入，不把整个文件读入内存，也不阻塞事件循环；
+    写入的同时计算文件的 SHA-256
+    
     Args:
         upload_file: 上传的文件
         
     Returns:
-        保存的文件路径和内容类型
+        保存的文件路径、内容类型和文件 SHA-256（十六进制）
     """
     content_type = upload_file.content_type
     
@@ -59,22 +107,41 @@ async def save_upload_file(upload_file: UploadFile) -> Tuple[str, str]:
     unique_filename = f"{uuid.uuid4()}{file_extension}"
     file_path = os.path.join(upload_dir, unique_filename)
     
-    # 保存文件
-    with open(file_path, "wb") as f:
-        content = await upload_file.read()
-        f.write(content)
+    # 分块保存文件
+    sha256 = hashlib.sha256()
+    try:
+        async with aiofiles.open(file_path, "wb") as f:
+            while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+                sha256.update(chunk)
+                await f.write(chunk)
+    except Exception:
+        # 写入失败时删除不完整的文件
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
     
     logger.info(f"已保存文件: {file_path}, 类型: {content_type}")
-    return file_path, content_type
+    return file_path, content_type, sha256.hexdigest()
 
-async def process_document_async(db: Session, doc_id: int) -> None:
+async def process_document_async(doc_id: int) -> None:
     """
     异步处理文档
     
+    文本提取、向量化和数据库读写都是阻塞操作，整体放到线程中执行，不阻塞事件循环；
+    使用独立的数据库会话，不依赖发起请求的会话（会话只在这个线程中使用）
+    
     Args:
-        db: 数据库会话
         doc_id: 文档ID
     """
+    await asyncio.to_thread(_process_document_in_session, doc_id)
+
+def _process_document_in_session(doc_id: int) -> None:
+    """在新的数据库会话中处理文档"""
+    with SessionLocal() as db:
+        _process_document(db, doc_id)
+
+def _process_document(db: Session, doc_id: int) -> None:
+    """提取文本并向量化文档，处理结果写回文档记录"""
     # 获取文档
     doc = get_document(db, doc_id)
     if not doc:
@@ -86,36 +153,58 @@ async def process_document_async(db: Session, doc_id: int) -> None:
         doc.processing_status = "processing"
         db.commit()
         
-        # 提取文本
-        text = extract_text_from_file(doc.file_path, doc.content_type)
-        
-        # 为较小的文档存储内容
-        if len(text) <= 100000:  # 大约10万字符(约20页)
-            doc.text_content = text
-        else:
-            # 对于大型文档，只存储摘要
-            doc.text_content = get_document_summary(text, max_length=5000)
-        
-        # 更新数据库
-        db.commit()
-        
         # 检查向量存储状态
         vector_store_status = get_vector_store_status()
         if vector_store_status["status"] == "not_configured":
+            _store_text_content(doc, _extract_text_for_storage(doc))
             doc.processing_status = "text_only"
             doc.processing_error = "未配置向量存储，只保存了文本内容"
             db.commit()
             logger.warning(f"文档 {doc_id} 只保存了文本，未配置向量存储")
             return
         
+        # 提取、切分和向量化同时进行：PDF 逐页提取，已经提取的页面先切分、嵌入和上传
+        parts: List[str] = []
+        extraction_error: Optional[Exception] = None
+        
+        def extracted_segments():
+            nonlocal extraction_error
+            try:
+                for segment in iter_text_from_file(doc.file_path, doc.content_type):
+                    parts.append(segment)
+                    yield segment
+            except Exception as e:
+                extraction_error = e
+                raise
+        
+        segments = extracted_segments()
+        
         # 处理文档并添加到向量存储
-        vector_ids, failed_texts, status = process_document(
+        vector_ids, failed_count, status = process_document(
             document_id=doc.id,
             document_title=doc.title,
-            text_content=text,
+            text_content=segments,
             namespace="default"
         )
         
+        if not parts and extraction_error is None:
+            # 向量化没有读取文本（例如未配置 API 密钥）：只提取保存文本内容需要的部分
+            segments.close()
+            text = _extract_text_for_storage(doc)
+        else:
+            # 向量化没有读取完的文本继续提取，用于保存文本内容
+            for _ in segments:
+                pass
+            
+            if extraction_error is not None:
+                # 提取中途失败时删除已经写入的部分向量
+                delete_document_vectors(doc.id)
+                raise extraction_error
+            
+            text = "".join(parts)
+        
+        _store_text_content(doc, text)
+        
         # 根据处理结果更新文档状态
         if status == "completed":
             doc.vector_ids = ",".join(vector_ids)
@@ -125,8 +214,8 @@ async def process_document_async(db: Session, doc_id: int) -> None:
         elif status == "partial":
             doc.vector_ids = ",".join(vector_ids)
             doc.processing_status = "partial"
-            doc.processing_error = f"部分文本块处理失败，成功率: {len(vector_ids)}/{len(vector_ids) + len(failed_texts)}"
-            logger.warning(f"文档 {doc_id} 部分处理完成: {len(vector_ids)} 成功, {len(failed_texts)} 失败")
+            doc.processing_error = f"部分文本块处理失败，成功率: {len(vector_ids)}/{len(vector_ids) + failed_count}"
+            logger.warning(f"文档 {doc_id} 部分处理完成: {len(vector_ids)} 成功, {failed_count} 失败")
         
         elif status == "api_key_missing":
             doc.processing_status = "text_only"
@@ -155,30 +244,186 @@ async def process_document_async(db: Session, doc_id: int) -> None:
         doc.processing_error = error_msg
         db.commit()
 
+def _extract_text_for_storage(doc: Document) -> str:
+    """
+    提取保存文本内容需要的文本
+    
+    超过 TEXT_CONTENT_MAX_CHARS 的文档只保存开头部分的摘要，
+    提取到 TEXT_CONTENT_MAX_CHARS + 1 个字符就足以判断并生成摘要，不需要提取剩余页面
+    """
+    return extract_text_from_file(doc.file_path, doc.content_type, max_chars=TEXT_CONTENT_MAX_CHARS + 1)
+
+def _store_text_content(doc: Document, text: str) -> None:
+    """保存文档文本内容：较小的文档保存全文，大型文档只保存摘要"""
+    if len(text) <= TEXT_CONTENT_MAX_CHARS:
+        doc.text_content = text
+    else:
+        doc.text_content = get_document_summary(text, max_length=5000)
+
+def _claim_next_document(db: Session) -> Optional[int]:
+    """
+    领取一个待处理的文档
+    
+    documents 表中 processing_status 为 pending 的记录就是持久化的处理任务；
+    processing 状态但租约已过期的文档（处理它的进程关闭或崩溃）也会被重新领取；
+    FOR UPDATE SKIP LOCKED 保证多个进程不会领取同一个文档，领取时写入 claimed_at 作为租约
+    """
+    lease_expired_before = func.now() - timedelta(seconds=DOCUMENT_LEASE_SECONDS)
+    doc_id = db.execute(
+        select(Document.id)
+        .where(or_(
+            Document.processing_status == "pending",
+            and_(
+                Document.processing_status == "processing",
+                or_(Document.claimed_at.is_(None), Document.claimed_at < lease_expired_before)
+            )
+        ))
+        .order_by(Document.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).scalar_one_or_none()
+    
+    if doc_id is None:
+        db.rollback()
+        return None
+    
+    db.execute(
+        update(Document)
+        .where(Document.id == doc_id)
+        .values(processing_status="processing", claimed_at=func.now())
+    )
+    db.commit()
+    return doc_id
+
+def _claim_next_document_in_session() -> Optional[int]:
+    """在新的数据库会话中领取一个待处理的文档"""
+    with SessionLocal() as db:
+        return _claim_next_document(db)
+
+def _renew_document_lease(doc_id: int) -> None:
+    """续期正在处理的文档的租约"""
+    with SessionLocal() as db:
+        db.execute(
+            update(Document)
+            .where(Document.id == doc_id, Document.processing_status == "processing")
+            .values(claimed_at=func.now())
+        )
+        db.commit()
+
+async def _keep_document_lease(doc_id: int) -> None:
+    """处理期间定期续期租约，直到被取消"""
+    while True:
+        await asyncio.sleep(DOCUMENT_LEASE_RENEW_SECONDS)
+        try:
+            await asyncio.to_thread(_renew_document_lease, doc_id)
+        except Exception as e:
+            logger.error(f"续期文档 {doc_id} 的处理租约失败: {str(e)}")
+
+async def _run_document_worker() -> None:
+    """后台 worker：依次处理待处理的文档，没有任务时等待通知或定期检查"""
+    while True:
+        _document_jobs_event.clear()
+        
+        try:
+            doc_id = await asyncio.to_thread(_claim_next_document_in_session)
+        except Exception as e:
+            logger.error(f"领取文档处理任务失败: {str(e)}")
+            doc_id = None
+        
+        if doc_id is not None:
+            lease_task = asyncio.create_task(_keep_document_lease(doc_id))
+            try:
+                await process_document_async(doc_id)
+            except Exception as e:
+                logger.error(f"文档 {doc_id} 处理任务异常退出: {str(e)}")
+            finally:
+                lease_task.cancel()
+            continue
+        
+        try:
+            await asyncio.wait_for(_document_jobs_event.wait(), timeout=DOCUMENT_WORKER_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+def start_document_worker() -> None:
+    """
+    启动文档处理 worker，在应用启动时调用
+    
+    每个应用进程各自启动一个 worker，通过 FOR UPDATE SKIP LOCKED 共享同一个队列；
+    启动前遗留的待处理文档和租约过期的中断文档也会被处理
+    """
+    global _document_worker_task, _document_jobs_event, _document_worker_loop
+    
+    if _document_worker_task is not None:
+        return
+    
+    _document_worker_loop = asyncio.get_running_loop()
+    _document_jobs_event = asyncio.Event()
+    _document_worker_task = asyncio.create_task(_run_document_worker())
+
+async def stop_document_worker() -> None:
+    """
+    停止文档处理 worker，在应用关闭时调用
+    
+    正在处理的文档保持 processing 状态，租约过期后由任一进程的 worker 重新领取并处理
+    """
+    global _document_worker_task
+    
+    if _document_worker_task is None:
+        return
+    
+    _document_worker_task.cancel()
+    try:
+        await _document_worker_task
+    except asyncio.CancelledError:
+        pass
+    _document_worker_task = None
+
+def enqueue_document_processing(doc_id: int) -> None:
+    """
+    通知 worker 有新的待处理文档
+    
+    任务本身已经通过 processing_status = "pending" 保存在数据库中，这里只负责唤醒 worker
+    """
+    logger.info(f"文档 {doc_id} 已加入处理队列")
+    if _document_worker_loop is not None and _document_jobs_event is not None:
+        _document_worker_loop.call_soon_threadsafe(_document_jobs_event.set)
+
 async def create_document(
     db: Session,
     file: UploadFile,
     title: str,
     description: Optional[str] = None,
-    user_id: Optional[int] = None,
-    background_tasks: Optional[BackgroundTasks] = None
-) -> Document:
+    user_id: Optional[int] = None
+) -> Tuple[Document, bool]:
     """
     创建新文档并安排处理任务
     
+    同一用户已经上传过内容完全相同的文件（SHA-256 相同）时，不再重复提取和向量化，
+    删除刚保存的文件并直接返回已有的文档（本次提交的标题和描述不会保存）；
+    已有文档没有完整处理（error、partial、text_only）时不复用，按新上传重新处理
+    
     Args:
         db: 数据库会话
         file: 上传的文件
         title: 文档标题
         description: 文档描述
         user_id: 上传用户ID
-        background_tasks: 用于添加后台任务的对象
         
     Returns:
-        创建的文档对象
+        (文档对象, 是否为复用的已有文档)
     """
     # 保存文件到磁盘
-    file_path, content_type = await save_upload_file(file)
+    file_path, content_type, file_sha256 = await save_upload_file(file)
+    
+    # 检查该用户是否已上传过相同内容的文件
+    existing = _get_document_by_sha256(db, user_id, file_sha256)
+    if existing:
+        if existing.processing_status in _REUSABLE_DUPLICATE_STATUSES:
+            return _reuse_existing_document(existing, file_path), True
+        # 之前没有完整处理：旧记录不再参与去重，新上传作为新文档处理
+        existing.file_sha256 = None
+        db.flush()
     
     # 创建文档记录
     doc = Document(
@@ -187,29 +432,51 @@ async def create_document(
         file_path=file_path,
         content_type=content_type,
         uploaded_by=user_id,
-        processing_status="pending"
+        processing_status="pending",
+        file_sha256=file_sha256
     )
     
     db.add(doc)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # 相同文件被并发上传，唯一索引冲突时使用先写入的文档
+        db.rollback()
+        existing = _get_document_by_sha256(db, user_id, file_sha256)
+        if not existing:
+            raise
+        return _reuse_existing_document(existing, file_path), True
     db.refresh(doc)
     
-    # 在后台处理文档
-    if background_tasks:
-        background_tasks.add_task(process_document_async, db, doc.id)
-    else:
-        # 如果没有提供 background_tasks，则立即创建异步任务
-        asyncio.create_task(process_document_async(db, doc.id))
+    # 交给后台 worker 处理
+    enqueue_document_processing(doc.id)
     
-    return doc
+    return doc, False
+
+def _get_document_by_sha256(db: Session, user_id: Optional[int], file_sha256: str) -> Optional[Document]:
+    """通过文件 SHA-256 获取该用户上传的文档"""
+    return db.execute(
+        select(Document)
+        .where(Document.uploaded_by == user_id)
+        .where(Document.file_sha256 == file_sha256)
+    ).scalar_one_or_none()
+
+def _reuse_existing_document(existing: Document, file_path: str) -> Document:
+    """删除重复上传的文件，返回已有的文档"""
+    logger.info(f"上传的文件与文档 {existing.id} 内容相同，跳过重复处理")
+    try:
+        os.remove(file_path)
+    except OSError as e:
+        logger.warning(f"删除重复文件失败: {file_path}, 错误: {str(e)}")
+    return existing
 
 def get_document(db: Session, document_id: int) -> Optional[Document]:
-    """获取文档"""
-    return db.query(Document).filter(Document.id == document_id).first()
+    """获取文档（按主键读取，已在会话中的文档不再查询数据库）"""
+    return db.get(Document, document_id)
 
 def get_documents(db: Session, skip: int = 0, limit: int = 100) -> List[Document]:
     """获取文档列表"""
-    return db.query(Document).order_by(Document.created_at.desc()).offset(skip).limit(limit).all()
+    return db.query(Document).options(_DOCUMENT_LIST_COLUMNS).order_by(Document.created_at.desc()).offset(skip).limit(limit).all()
 
 def search_documents_by_keyword(db: Session, keyword: str, skip: int = 0, limit: int = 100) -> List[Document]:
     """
@@ -225,7 +492,7 @@ def search_documents_by_keyword(db: Session, keyword: str, skip: int = 0, limit:
         匹配的文档列表
     """
     search_term = f"%{keyword}%"
-    return db.query(Document).filter(
+    return db.query(Document).options(_DOCUMENT_LIST_COLUMNS).filter(
         (Document.title.ilike(search_term)) | 
         (Document.description.ilike(search_term))
     ).order_by(Document.created_at.desc()).offset(skip).limit(limit).all()
@@ -295,14 +562,13 @@ def delete_document(db: Session, document_id: int) -> bool:
         logger.error(f"删除文档 {document_id} 失败: {str(e)}")
         return False
 
-def retry_document_processing(db: Session, document_id: int, background_tasks: Optional[BackgroundTasks] = None) -> bool:
+def retry_document_processing(db: Session, document_id: int) -> bool:
     """
     重试文档处理
     
     Args:
         db: 数据库会话
         document_id: 文档ID
-        background_tasks: 用于添加后台任务的对象
         
     Returns:
         成功则返回 True
@@ -317,11 +583,7 @@ def retry_document_processing(db: Session, document_id: int, background_tasks: O
     doc.vector_ids = None
     db.commit()
     
-    # 在后台重新处理文档
-    if background_tasks:
-        background_tasks.add_task(process_document_async, db, doc.id)
-    else:
-        # 如果没有提供 background_tasks，则立即创建异步任务
-        asyncio.create_task(process_document_async(db, doc.id))
+    # 交给后台 worker 重新处理
+    enqueue_document_processing(doc.id)
     
     return True 
\ No newline at end of file
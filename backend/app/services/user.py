@@ -1,4 +1,6 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, load_only
 from typing import List, Optional
 
 from app.models.user import User
@@ -6,10 +8,19 @@ from app.schemas.user import UserCreate, UserUpdate
 from app.core.security import get_password_hash, verify_password
 
 def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
-    return db.query(User).offset(skip).limit(limit).all()
+    # 列表不需要密码哈希
+    return db.query(User).options(load_only(
+        User.id,
+        User.email,
+        User.full_name,
+        User.is_active,
+        User.is_superuser,
+        User.created_at,
+        User.updated_at
+    )).offset(skip).limit(limit).all()
 
 def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
-    return db.query(User).filter(User.id == user_id).first()
+    return db.get(User, user_id)
 
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     return db.query(User).filter(User.email == email).first()
@@ -22,40 +33,66 @@ def check_user_exists(db: Session, email: str) -> bool:
     return user is not None
 
 def create_user(db: Session, user_in: UserCreate) -> User:
-    # 检查用户是否已存在
-    if check_user_exists(db, user_in.email):
+    """
+    创建用户
+    
+    INSERT ... ON CONFLICT DO NOTHING RETURNING 一条语句完成检查和插入，
+    邮箱已存在时不返回记录；不需要先查询邮箱是否存在
+    """
+    db_user = db.execute(
+        insert(User)
+        .values(
+            email=user_in.email,
+            hashed_password=get_password_hash(user_in.password),
+            full_name=user_in.full_name,
+            is_active=user_in.is_active,
+            is_superuser=user_in.is_superuser,
+        )
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User)
+    ).scalar_one_or_none()
+    
+    if db_user is None:
+        db.rollback()
         raise ValueError(f"Email {user_in.email} already registered")
-        
-    db_user = User(
-        email=user_in.email,
-        hashed_password=get_password_hash(user_in.password),
-        full_name=user_in.full_name,
-        is_active=user_in.is_active,
-        is_superuser=user_in.is_superuser,
-    )
-    db.add(db_user)
+    
+    # 字段已由 RETURNING 取回，提交前从会话中分离，避免提交后过期再 SELECT
+    db.expunge(db_user)
     db.commit()
-    db.refresh(db_user)
     return db_user
 
 def update_user(db: Session, user: User, user_in: UserUpdate) -> User:
-    # Update the basic fields
-    user_data = user.__dict__
-    for field in user_data:
-        if field in user_in.__dict__ and getattr(user_in, field) is not None:
-            setattr(user, field, getattr(user_in, field))
+    """
+    更新用户信息（只更新非空字段）
+    
+    UPDATE ... RETURNING 一条语句完成更新并取回最新数据，不需要提交后再 SELECT
+    """
+    values = {
+        field: value
+        for field, value in user_in.model_dump(exclude={"password"}).items()
+        if value is not None
+    }
     
     # Handle password update
     if user_in.password:
-        user.hashed_password = get_password_hash(user_in.password)
+        values["hashed_password"] = get_password_hash(user_in.password)
+    
+    if not values:
+        return user
     
-    db.add(user)
+    db_user = db.execute(
+        update(User)
+        .where(User.id == user.id)
+        .values(**values)
+        .returning(User)
+    ).scalar_one()
+    
+    db.expunge(db_user)
     db.commit()
-    db.refresh(user)
-    return user
+    return db_user
 
 def delete_user(db: Session, user_id: int) -> User:
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.get(User, user_id)
     db.delete(user)
     db.commit()
     return user
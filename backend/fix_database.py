@@ -3,11 +3,28 @@
 """
 import os
 import sys
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, bindparam
 
 sys.path.append(os.path.abspath('.'))
 from app.core.config import settings
 
+# 允许添加的列及其类型（白名单，只有这里列出的列名会出现在 DDL 中）
+COLUMNS_TO_ADD = {
+    "filename": "VARCHAR",
+    "file_size": "INTEGER DEFAULT 0",
+    "text_content": "TEXT",
+    "is_processed": "BOOLEAN DEFAULT false",
+    "vectorized": "BOOLEAN DEFAULT false",
+    "file_sha256": "VARCHAR(64)",
+    "claimed_at": "TIMESTAMP WITH TIME ZONE"
+}
+
+# 一次查询 documents 表中已存在的相关列
+_EXISTING_COLUMNS_QUERY = text("""
+SELECT column_name FROM information_schema.columns
+WHERE table_name = 'documents' AND column_name IN :names;
+""").bindparams(bindparam("names", expanding=True))
+
 def main():
     """添加缺少的列到documents表"""
     # 创建数据库连接
@@ -19,19 +36,11 @@ def main():
     
     engine = create_engine(db_url)
     
-    # 定义需要添加的列
-    columns_to_add = [
-        ("filename", "VARCHAR"),
-        ("file_size", "INTEGER DEFAULT 0"),
-        ("text_content", "TEXT"),
-        ("is_processed", "BOOLEAN DEFAULT false"),
-        ("vectorized", "BOOLEAN DEFAULT false")
-    ]
-    
-    # 先检查表是否存在
-    with engine.connect() as conn:
+    # 所有检查和修改在同一个事务中完成；每一步使用保存点，单步失败不影响其他步骤
+    with engine.begin() as conn:
+        # 先检查表是否存在
         check_table = text("""
-        SELECT table_name FROM information_schema.tables 
+        SELECT table_name FROM information_schema.tables
         WHERE table_name = 'documents';
         """)
         
@@ -39,50 +48,62 @@ def main():
         if not has_table:
             print("documents表不存在，无需修复")
             return
-    
-    # 检查content列是否存在，如果存在需要重命名为text_content
-    with engine.connect() as conn:
-        with conn.begin():
-            # 检查content列是否存在
-            check_content = text("""
-            SELECT column_name FROM information_schema.columns 
-            WHERE table_name = 'documents' AND column_name = 'content';
-            """)
-            
-            has_content = conn.execute(check_content).fetchone()
-            
-            if has_content:
-                print("将 content 列重命名为 text_content...")
-                try:
+        
+        existing = set(conn.execute(
+            _EXISTING_COLUMNS_QUERY,
+            {"names": ["content", *COLUMNS_TO_ADD]}
+        ).scalars())
+        quote = conn.dialect.identifier_preparer.quote
+        
+        # 检查content列是否存在，如果存在需要重命名为text_content
+        if "content" in existing:
+            print("将 content 列重命名为 text_content...")
+            try:
+                with conn.begin_nested():
                     conn.execute(text("ALTER TABLE documents RENAME COLUMN content TO text_content;"))
-                    print("列重命名成功")
-                    # 如果重命名成功，则不需要再添加text_content
-                    columns_to_add = [col for col in columns_to_add if col[0] != "text_content"]
-                except Exception as e:
-                    print(f"重命名列失败: {str(e)}")
-    
-    # 添加缺少的列
-    with engine.connect() as conn:
-        with conn.begin():
-            for column_name, column_type in columns_to_add:
-                # 检查列是否存在
-                check_query = text(f"""
-                SELECT column_name FROM information_schema.columns 
-                WHERE table_name = 'documents' AND column_name = '{column_name}';
-                """)
-                
-                result = conn.execute(check_query).fetchone()
-                if not result:
-                    print(f"添加 {column_name} 列...")
-                    try:
-                        conn.execute(text(f"ALTER TABLE documents ADD COLUMN {column_name} {column_type};"))
-                        print(f"{column_name} 列添加成功")
-                    except Exception as e:
-                        print(f"添加 {column_name} 列失败: {str(e)}")
-                else:
-                    print(f"{column_name} 列已存在")
+                print("列重命名成功")
+                # 如果重命名成功，则不需要再添加text_content
+                existing.add("text_content")
+            except Exception as e:
+                print(f"重命名列失败: {str(e)}")
+        
+        # 添加缺少的列
+        for column_name, column_type in COLUMNS_TO_ADD.items():
+            if column_name in existing:
+                print(f"{column_name} 列已存在")
+                continue
+            
+            print(f"添加 {column_name} 列...")
+            try:
+                with conn.begin_nested():
+                    conn.execute(text(f"ALTER TABLE documents ADD COLUMN {quote(column_name)} {column_type};"))
+                print(f"{column_name} 列添加成功")
+            except Exception as e:
+                print(f"添加 {column_name} 列失败: {str(e)}")
+        
+        # 文件去重按上传用户区分：去掉旧版本添加的全局唯一约束，改为 (uploaded_by, file_sha256) 唯一索引
+        print("检查 file_sha256 唯一索引...")
+        try:
+            with conn.begin_nested():
+                conn.execute(text("ALTER TABLE documents DROP CONSTRAINT IF EXISTS documents_file_sha256_key;"))
+                conn.execute(text(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS ix_documents_uploaded_by_file_sha256 "
+                    "ON documents (uploaded_by, file_sha256);"
+                ))
+            print("file_sha256 唯一索引已就绪")
+        except Exception as e:
+            print(f"创建 file_sha256 唯一索引失败: {str(e)}")
+        
+        # 文档列表按创建时间倒序分页，确保排序使用的索引存在
+        print("检查 created_at 索引...")
+        try:
+            with conn.begin_nested():
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_documents_created_at ON documents (created_at);"))
+            print("created_at 索引已就绪")
+        except Exception as e:
+            print(f"创建 created_at 索引失败: {str(e)}")
     
     print("数据库修复完成!")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -3,12 +3,20 @@ Pinecone向量存储修复脚本 - 检查配置并初始化索引
 """
 import os
 import sys
+import time
 import requests
 import json
+from requests.adapters import HTTPAdapter
 
 sys.path.append(os.path.abspath('.'))
 from app.core.config import settings
 
+# 等待索引就绪：首次间隔1秒，每次乘以1.5，最长30秒，总共最多等待3分钟
+READY_INITIAL_DELAY_SECONDS = 1.0
+READY_MAX_DELAY_SECONDS = 30.0
+READY_BACKOFF_FACTOR = 1.5
+READY_TIMEOUT_SECONDS = 180
+
 def main():
     """检查Pinecone配置并初始化索引"""
     print("开始检查Pinecone配置...")
@@ -24,15 +32,15 @@ def main():
     # 使用REST API直接创建索引
     try:
         # 列出现有索引
-        headers = {
+        # 所有请求共用一个会话，只建立一次 TCP+TLS 连接
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        session.headers.update({
             "Api-Key": settings.PINECONE_API_KEY,
             "Accept": "application/json"
-        }
+        })
         
-        response = requests.get(
-            "https://api.pinecone.io/indexes",
-            headers=headers
-        )
+        response = session.get("https://api.pinecone.io/indexes")
         
         if response.status_code != 200:
             print(f"无法获取索引列表: {response.status_code} {response.text}")
@@ -52,9 +60,8 @@ def main():
             if answer.lower() == 'y':
                 print(f"正在删除索引 {settings.PINECONE_INDEX_NAME}...")
                 
-                response = requests.delete(
-                    f"https://api.pinecone.io/indexes/{settings.PINECONE_INDEX_NAME}",
-                    headers=headers
+                response = session.delete(
+                    f"https://api.pinecone.io/indexes/{settings.PINECONE_INDEX_NAME}"
                 )
                 
                 if response.status_code >= 200 and response.status_code < 300:
@@ -72,7 +79,7 @@ def main():
         # 创建索引请求
         create_request = {
             "name": settings.PINECONE_INDEX_NAME,
-            "dimension": 1536,  # OpenAI embeddings 维度
+            "dimension": settings.EMBED_DIMENSIONS,  # OpenAI embeddings 维度
             "metric": "cosine",
             "spec": {
                 "serverless": {
@@ -82,9 +89,9 @@ def main():
             }
         }
         
-        response = requests.post(
+        response = session.post(
             "https://api.pinecone.io/indexes",
-            headers={**headers, "Content-Type": "application/json"},
+            headers={"Content-Type": "application/json"},
             data=json.dumps(create_request)
         )
         
@@ -96,12 +103,12 @@ def main():
             
         # 验证索引是否可用 - 等待索引就绪
         print("等待索引就绪...")
-        import time
-        # 最多等待2分钟
-        for i in range(12):
-            response = requests.get(
-                f"https://api.pinecone.io/indexes/{settings.PINECONE_INDEX_NAME}",
-                headers=headers
+        # 按指数退避轮询，索引通常几十秒内就绪，不必每次固定等待
+        delay = READY_INITIAL_DELAY_SECONDS
+        deadline = time.monotonic() + READY_TIMEOUT_SECONDS
+        while True:
+            response = session.get(
+                f"https://api.pinecone.io/indexes/{settings.PINECONE_INDEX_NAME}"
             )
             
             if response.status_code == 200:
@@ -112,8 +119,12 @@ def main():
                     return
                 else:
                     print(f"索引状态: {status}, 继续等待...")
-                    
-            time.sleep(10)  # 等待10秒再检查
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(delay, remaining))
+            delay = min(READY_MAX_DELAY_SECONDS, delay * READY_BACKOFF_FACTOR)
         
         print("索引创建后未能在预期时间内就绪")
     except Exception as e:
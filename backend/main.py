@@ -1,14 +1,30 @@
 import uvicorn
 from app.api.app import create_app
 from app.core.init_data import init_app_data
+from app.services.document import start_document_worker, stop_document_worker
+
+try:
+    # 使用 uvloop 替换默认事件循环（Windows 不支持）
+    import uvloop
+    uvloop.install()
+except ImportError:
+    uvloop = None
 
 app = create_app()
 
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     """应用启动时的事件处理"""
     # 初始化默认数据
     init_app_data()
+    # 启动文档处理 worker
+    start_document_worker()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时的事件处理"""
+    # 停止文档处理 worker
+    await stop_document_worker()
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, loop="uvloop" if uvloop else "auto")